@@ -1 +1,5 @@
 # This file makes the app directory a Python package
+from dotenv import load_dotenv
+
+# Load .env once, before any module reads its settings
+load_dotenv()
@@ -0,0 +1,41 @@
+"""
+Server-side aggregation helpers.
+
+count() runs as a Firestore aggregation query: the server returns a single
+number, billed one read per 1000 index entries, however many documents
+match. aggregate_many() runs several aggregations at once.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict
+
+from app.database import db_slot
+
+
+def _value(result) -> Any:
+    return result[0][0].value
+
+
+async def count(query, transaction=None) -> int:
+    """Number of documents matching query. In a transaction it runs on the
+    transaction's db_slot() rather than taking another"""
+    try:
+        aggregation = query.count(alias="count")
+    except AttributeError:
+        aggregation = None
+
+    if transaction is not None:
+        if aggregation is None:
+            return len(await query.select([]).get(transaction=transaction))
+        return int(_value(await aggregation.get(transaction=transaction)))
+
+    if aggregation is None:
+        async with db_slot():
+            return len(await query.select([]).get())
+    async with db_slot():
+        return int(_value(await aggregation.get()))
+
+
+async def aggregate_many(aggregations: Dict[str, Awaitable[Any]]) -> Dict[str, Any]:
+    """Await named aggregations concurrently, e.g. {"members": count(query), ...}"""
+    values = await asyncio.gather(*aggregations.values())
+    return dict(zip(aggregations.keys(), values))
@@ -0,0 +1,181 @@
+"""
+Streak and consistency analytics over day bitsets.
+
+A member's activity for one habit is stored as a Python int whose bit i is
+set when they logged on day ``origin + i`` (origin is a date ordinal). Ints
+are arbitrary-precision, and shifts, ands and bit_count() run in C over the
+whole number at once, so a year of history is one ~46-byte value and the
+streak/consistency queries below take a handful of operations instead of a
+Python loop per day. ActivityMatrix evaluates them for every member of a
+group or cohort in one pass.
+
+Current streaks follow compute_streak: consecutive days ending today.
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from app.utils import to_utc_date
+
+Day = Union[date, int]
+
+
+def _ordinal(day: Day) -> int:
+    return day if isinstance(day, int) else day.toordinal()
+
+
+def day_mask(days: Iterable[Day], origin: int) -> int:
+    """Bitset of the given days (dates or ordinals) relative to origin"""
+    mask = 0
+    for day in days:
+        offset = _ordinal(day) - origin
+        if offset < 0:
+            raise ValueError("Day before the mask origin")
+        mask |= 1 << offset
+    return mask
+
+
+def trailing_run(mask: int, end: int) -> int:
+    """Number of consecutive set bits ending at bit `end` (inclusive)"""
+    if end < 0:
+        return 0
+    gaps = ~mask & ((1 << (end + 1)) - 1)
+    if not gaps:
+        return end + 1
+    return end - (gaps.bit_length() - 1)
+
+
+def longest_run(mask: int) -> int:
+    """Length of the longest run of set bits, in O(log run) big-int operations"""
+    if not mask:
+        return 0
+    # runs[i] has a bit set wherever a run of at least 2**i days starts
+    runs = [mask]
+    while True:
+        step = 1 << (len(runs) - 1)
+        longer = runs[-1] & (runs[-1] >> step)
+        if not longer:
+            break
+        runs.append(longer)
+
+    # Extend the longest power-of-two run by smaller powers while one fits
+    length = 1 << (len(runs) - 1)
+    starts = runs[-1]
+    for i in range(len(runs) - 2, -1, -1):
+        extended = starts & (runs[i] >> length)
+        if extended:
+            starts = extended
+            length += 1 << i
+    return length
+
+
+def active_days(mask: int, start: int, end: int) -> int:
+    """Number of set bits between bit positions start and end (inclusive)"""
+    start = max(start, 0)
+    if end < start:
+        return 0
+    return ((mask >> start) & ((1 << (end - start + 1)) - 1)).bit_count()
+
+
+def rolling_counts(mask: int, start: int, end: int, window: int = 7) -> List[int]:
+    """Active days in the trailing `window` days for every bit from start to end"""
+    count = active_days(mask, start - window + 1, start)
+    counts = [count]
+    for position in range(start + 1, end + 1):
+        if position >= 0:
+            count += (mask >> position) & 1
+        if position - window >= 0:
+            count -= (mask >> (position - window)) & 1
+        counts.append(count)
+    return counts
+
+
+class ActivityMatrix:
+    """
+    Day bitsets for many (member, habit) pairs over a shared origin, plus
+    per-pair log counts and value totals.
+    """
+
+    def __init__(self, origin: Optional[Day] = None):
+        self.origin = _ordinal(origin) if origin is not None else None
+        self.masks: Dict[Tuple[Hashable, str], int] = defaultdict(int)
+        self.logs: Dict[Tuple[Hashable, str], int] = defaultdict(int)
+        self.totals: Dict[Tuple[Hashable, str], float] = defaultdict(float)
+
+    @classmethod
+    def from_logs(cls, logs: Iterable[Dict[str, Any]], origin: Optional[Day] = None) -> "ActivityMatrix":
+        """Build from habit_logs documents (uid, habitType, timestamp, value)"""
+        matrix = cls(origin)
+        for log in logs:
+            matrix.add(log["uid"], log["habitType"], to_utc_date(log["timestamp"]), log.get("value") or 0)
+        return matrix
+
+    def _rebase(self, ordinal: int) -> None:
+        """Move the origin back to ordinal so earlier days fit at bit 0"""
+        if self.origin is None:
+            self.origin = ordinal
+        elif ordinal < self.origin:
+            shift = self.origin - ordinal
+            for key in self.masks:
+                self.masks[key] <<= shift
+            self.origin = ordinal
+
+    def add(self, member: Hashable, habit: str, day: Day, value: float = 0) -> None:
+        """Record one log"""
+        ordinal = _ordinal(day)
+        self._rebase(ordinal)
+        key = (member, habit)
+        self.masks[key] |= 1 << (ordinal - self.origin)
+        self.logs[key] += 1
+        self.totals[key] += value
+
+    def add_days(self, member: Hashable, habit: str, days: Iterable[Day], value: float = 0) -> None:
+        """Record one log on each of many days (bulk loads, e.g. from streak history)"""
+        ordinals = [_ordinal(day) for day in days]
+        if not ordinals:
+            return
+        self._rebase(min(ordinals))
+        key = (member, habit)
+        self.masks[key] |= day_mask(ordinals, self.origin)
+        self.logs[key] += len(ordinals)
+        self.totals[key] += value * len(ordinals)
+
+    def member_masks(self) -> Dict[Hashable, int]:
+        """Days each member logged any habit"""
+        combined: Dict[Hashable, int] = defaultdict(int)
+        for (member, _), mask in self.masks.items():
+            combined[member] |= mask
+        return dict(combined)
+
+    def _position(self, day: Day) -> int:
+        return _ordinal(day) - (self.origin or 0)
+
+    def current_streaks(self, today: Day) -> Dict[Tuple[Hashable, str], int]:
+        """Consecutive days ending today, per (member, habit)"""
+        end = self._position(today)
+        return {key: trailing_run(mask, end) for key, mask in self.masks.items()}
+
+    def best_streaks(self) -> Dict[Tuple[Hashable, str], int]:
+        """Longest run of consecutive days ever, per (member, habit)"""
+        return {key: longest_run(mask) for key, mask in self.masks.items()}
+
+    def consistency(self, today: Day, window: int = 7) -> Dict[Hashable, float]:
+        """Percent of the last `window` days (ending today) on which each member logged anything"""
+        end = self._position(today)
+        return {
+            member: round(active_days(mask, end - window + 1, end) / window * 100, 1)
+            for member, mask in self.member_masks().items()
+        }
+
+    def rolling_consistency(self, member: Hashable, start: Day, end: Day, window: int = 7) -> List[float]:
+        """Trailing-window consistency percent for each day from start to end"""
+        mask = self.member_masks().get(member, 0)
+        counts = rolling_counts(mask, self._position(start), self._position(end), window)
+        return [round(count / window * 100, 1) for count in counts]
+
+    def habit_totals(self) -> Dict[Tuple[Hashable, str], Dict[str, float]]:
+        """Active days, log count and summed value per (member, habit)"""
+        return {
+            key: {"days": mask.bit_count(), "logs": self.logs[key], "total": self.totals[key]}
+            for key, mask in self.masks.items()
+        }
@@ -0,0 +1,41 @@
+"""
+Backfill daily_rollups from raw habit_logs for users whose history predates
+them, or the join_codes index for groups created before it. Safe to run
+against live traffic and to re-run.
+
+    python -m app.backfill                      # every user in `users`
+    python -m app.backfill --uid abc --uid def  # specific users
+    python -m app.backfill --join-codes         # index every group's join code
+"""
+import argparse
+import asyncio
+import time
+
+from app import crud
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill daily rollup documents or the join code index")
+    parser.add_argument("--uid", action="append", help="Only backfill these users")
+    parser.add_argument("--concurrency", type=int, default=8, help="Users backfilled at once")
+    parser.add_argument("--join-codes", action="store_true", help="Index group join codes instead")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.join_codes:
+        added = await crud.backfill_join_codes()
+        print(f"Indexed {added} join codes in {time.perf_counter() - start:.1f}s")
+        return
+
+    if args.uid:
+        written = {uid: await crud.backfill_daily_rollups(uid) for uid in args.uid}
+    else:
+        written = await crud.backfill_all_rollups(args.concurrency)
+    print(
+        f"Backfilled {len(written)} users, {sum(written.values())} day docs "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,49 +1,180 @@
-from datetime import datetime, date
-from typing import List, Optional, Dict, Any
+import asyncio
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime, date, time, timedelta
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from google.api_core.exceptions import AlreadyExists
 from google.cloud import firestore
-# Handle imports for different execution contexts
-try:
-    from app.database import get_db
-    from app.utils import generate_join_code, compute_streak, get_default_unit
-    from app.models import HabitType, GroupRole
-except ImportError:
-    from database import get_db
-    from utils import generate_join_code, compute_streak, get_default_unit
-    from models import HabitType, GroupRole
+from app.database import get_db, db_slot, run_transaction
+from app.utils import generate_join_code, get_default_unit, add_day_counts, to_utc_date, day_key, parse_day_key
+from app.utils import streak_state, advance_streak, current_streak
+from app.models import HabitType, GroupRole, HabitLogRecord, HABIT_LOG_FIELDS
+from app.response_cache import response_cache, user_scope, group_scope
+from app.write_queue import WriteQueue, LOG_QUEUE_ENABLED
+from app.user_cache import user_cache
+from app.membership_cache import membership_cache
+from app import aggregation
 
 
+# Connects on first use (or when the app starts), not at import
 db = get_db()
 
+# Firestore's limit on writes per commit
+MAX_BATCH_WRITES = 500
+
+# Rolling window used for leaderboard consistency scores, in UTC calendar days
+# (today included)
+LEADERBOARD_WINDOW_DAYS = 7
+
+# Days of daily_rollups rebuilt per transaction by backfill_daily_rollups
+ROLLUP_BACKFILL_DAYS = 100
+
+# Random codes drawn per group creation before giving up on finding a free one
+JOIN_CODE_ATTEMPTS = 5
+
+# Recently used join codes remembered per worker (code -> group id)
+JOIN_CODE_CACHE_SIZE = 10000
+
+def leaderboard_window_start() -> datetime:
+    """
+    Midnight (UTC) starting the rolling leaderboard window. Logs are counted
+    per calendar day, so the window is whole days: today and the 6 before it
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=LEADERBOARD_WINDOW_DAYS - 1)
+
 # User CRUD operations
 async def create_or_update_user(uid: str, email: str = None, display_name: str = None, photo_url: str = None) -> Dict[str, Any]:
-    """Create or update user in Firestore"""
+    """
+    Sync a user's profile from their token claims. A profile this worker has
+    already stored costs nothing. Otherwise the doc is read: a returning user
+    costs that read plus a merge only if a field changed, a new one the read
+    plus a conditional create.
+    """
+    profile = {"uid": uid, "email": email, "displayName": display_name, "photoUrl": photo_url}
+    if user_cache.matches(uid, profile):
+        return profile
+    
     user_ref = db.collection("users").document(uid)
-    user_data = {
-        "uid": uid,
-        "email": email,
-        "displayName": display_name,
-        "photoUrl": photo_url,
-        "updatedAt": firestore.SERVER_TIMESTAMP
-    }
+    async with db_slot():
+        user_doc = await user_ref.get()
     
-    # Only set createdAt if it's a new user
-    user_doc = user_ref.get()
-    if not user_doc.exists:
-        user_data["createdAt"] = firestore.SERVER_TIMESTAMP
+    stored = user_doc.to_dict() if user_doc.exists else None
+    if stored is None:
+        try:
+            async with db_slot():
+                await user_ref.create({
+                    **profile,
+                    "createdAt": firestore.SERVER_TIMESTAMP,
+                    "updatedAt": firestore.SERVER_TIMESTAMP
+                })
+        except AlreadyExists:
+            # A concurrent login created it since the read; make sure our fields land
+            stored = {}
     
-    user_ref.set(user_data, merge=True)
-    return user_data
+    if stored is not None and any(stored.get(field) != value for field, value in profile.items()):
+        async with db_slot():
+            await user_ref.set({**profile, "updatedAt": firestore.SERVER_TIMESTAMP}, merge=True)
+        # Leaderboards copy the name when the user joins, so carry changes over
+        if stored.get("displayName") != display_name:
+            await _refresh_member_names(uid, display_name)
+    
+    user_cache.put(uid, profile)
+    return profile
 
 # Habit CRUD operations
 async def add_habit_log(uid: str, habit_type: HabitType, value: float, unit: str = None, timestamp: datetime = None) -> str:
     """Add a habit log entry"""
+    log_ref = db.collection("habit_logs").document()
+    log_data = _habit_log_data(uid, habit_type, value, unit, timestamp)
+    if habit_log_queue is not None:
+        await habit_log_queue.submit(uid, (log_ref, log_data))
+        return log_ref.id
+    
+    _, group_ids = await run_transaction(_write_habit_logs, uid, [(log_ref, log_data)], False)
+    await response_cache.invalidate(user_scope(uid), *map(group_scope, group_ids))
+    return log_ref.id
+
+async def _flush_habit_logs(uid: str, logs: List[Tuple[Any, Dict[str, Any]]], retry: bool) -> None:
+    """
+    Write a burst of one user's queued logs in a single transaction. Log ids
+    are assigned when queued and a retry skips ids that already exist, so a
+    flush that was committed before it failed never duplicates a log.
+    """
+    _, group_ids = await run_transaction(_write_habit_logs, uid, logs, retry)
+    await response_cache.invalidate(user_scope(uid), *map(group_scope, group_ids))
+
+# Coalesces rapid single-log writes (e.g. repeated "+1 glass" taps) per user
+habit_log_queue = WriteQueue(_flush_habit_logs) if LOG_QUEUE_ENABLED else None
+
+async def add_habit_logs(uid: str, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Add many habit logs with client-supplied ids (entries carry client_id,
+    habit_type, value, unit, timestamp). Logs are committed in chunks of up to
+    MAX_BATCH_WRITES writes; ids that already exist are skipped, so retrying a
+    batch is safe. Returns one {id, status, error} result per entry.
+    """
+    results = []
+    pending = []
+    seen = set()
+    for entry in entries:
+        log_id = f"{uid}_{entry['client_id']}"
+        if log_id in seen:
+            results.append({"id": log_id, "status": "duplicate", "error": None})
+            continue
+        seen.add(log_id)
+        result = {"id": log_id, "status": None, "error": None}
+        results.append(result)
+        log_data = _habit_log_data(uid, entry["habit_type"], entry["value"], entry.get("unit"), entry.get("timestamp"))
+        pending.append((result, db.collection("habit_logs").document(log_id), log_data))
+    
+    if not pending:
+        return results
+    
+    # Leave room in each commit for the activity, streak and leaderboard writes
+    async with db_slot():
+        activity_doc = await db.collection("user_activity").document(uid).get()
+    group_count = len(activity_doc.get("groupIds") or []) if activity_doc.exists else 0
+    chunk_size = max(2, MAX_BATCH_WRITES - 1 - len(HabitType) - group_count)
+    
+    # Each chunk writes its logs plus one rollup doc per distinct day
+    chunks, chunk, chunk_days = [], [], set()
+    for item in pending:
+        key = day_key(to_utc_date(item[2]["timestamp"]))
+        if chunk and len(chunk) + len(chunk_days | {key}) + 1 > chunk_size:
+            chunks.append(chunk)
+            chunk, chunk_days = [], set()
+        chunk.append(item)
+        chunk_days.add(key)
+    chunks.append(chunk)
+    
+    touched_groups = set()
+    for chunk in chunks:
+        try:
+            created, group_ids = await run_transaction(
+                _write_habit_logs, uid, [(log_ref, log_data) for _, log_ref, log_data in chunk], True
+            )
+            touched_groups.update(group_ids)
+            for (result, _, _), is_new in zip(chunk, created):
+                result["status"] = "created" if is_new else "duplicate"
+        except Exception as e:
+            for result, _, _ in chunk:
+                result["status"] = "failed"
+                result["error"] = str(e)
+    
+    if any(result["status"] == "created" for result in results):
+        await response_cache.invalidate(user_scope(uid), *map(group_scope, touched_groups))
+    return results
+
+def _habit_log_data(uid: str, habit_type: HabitType, value: float, unit: str = None, timestamp: datetime = None) -> Dict[str, Any]:
     if timestamp is None:
         timestamp = datetime.utcnow()
     
     if unit is None:
         unit = get_default_unit(habit_type)
     
-    log_data = {
+    return {
         "uid": uid,
         "habitType": habit_type.value,
         "value": value,
@@ -51,78 +182,568 @@ async def add_habit_log(uid: str, habit_type: HabitType, value: float, unit: str
         "timestamp": timestamp,
         "createdAt": firestore.SERVER_TIMESTAMP
     }
+
+async def _write_habit_logs(transaction, uid: str, logs: List[Tuple[Any, Dict[str, Any]]],
+                            check_existing: bool) -> Tuple[List[bool], List[str]]:
+    """
+    Write logs together with the user's leaderboard counters and streaks.
+    Returns which logs were created (False for ids that already existed) and
+    the ids of the groups whose leaderboards were updated.
+    """
+    created = [True] * len(logs)
+    if check_existing:
+        refs = [log_ref for log_ref, _ in logs]
+        existing = {doc.id async for doc in db.get_all(refs, transaction=transaction) if doc.exists}
+        created = [log_ref.id not in existing for log_ref, _ in logs]
+    
+    new_logs = [(log_ref, log_data) for (log_ref, log_data), is_new in zip(logs, created) if is_new]
+    if not new_logs:
+        return created, []
     
-    doc_ref = db.collection("habit_logs").add(log_data)
-    return doc_ref[1].id
+    activity = await _load_activity(transaction, uid)
+    streaks = {}
+    for habit_type in {HabitType(log_data["habitType"]) for _, log_data in new_logs}:
+        dates = [to_utc_date(log_data["timestamp"]) for _, log_data in new_logs if log_data["habitType"] == habit_type.value]
+        streaks[habit_type] = await _next_streak(
+            transaction, uid, habit_type, dates, activity.get("rollupsComplete", False)
+        )
+    
+    for log_ref, log_data in new_logs:
+        transaction.set(log_ref, log_data)
+    _record_rollups(transaction, uid, [log_data for _, log_data in new_logs])
+    _record_activity(transaction, activity, [log_data["timestamp"] for _, log_data in new_logs])
+    for habit_type, streak in streaks.items():
+        _write_streak(transaction, uid, habit_type, streak)
+    return created, list(activity.get("groupIds") or [])
 
-async def get_habit_logs(uid: str, habit_type: HabitType = None, days: int = 7) -> List[Dict[str, Any]]:
-    """Get habit logs for a user"""
+# Leaderboard counters
+#
+# user_activity/{uid} keeps per-day log counts for the rolling window plus the
+# ids of the user's groups. Every write copies the user's day counts into
+# group_leaderboards/{group_id}.members.{uid}, so a leaderboard is one read.
+async def _window_day_counts(uid: str, transaction=None) -> Dict[str, int]:
+    """Count a user's logs per day over the leaderboard window from raw habit_logs"""
+    query = (db.collection("habit_logs")
+             .where("uid", "==", uid)
+             .where("timestamp", ">=", leaderboard_window_start()))
+    if transaction is None:
+        async with db_slot():
+            docs = await query.get()
+    else:
+        docs = await query.get(transaction=transaction)
+    
+    return add_day_counts({}, (doc.get("timestamp") for doc in docs), leaderboard_window_start().date())
+
+async def _load_activity(transaction, uid: str) -> Dict[str, Any]:
+    """Read a user's activity doc, bootstrapping it from raw data the first time"""
+    snapshot = await db.collection("user_activity").document(uid).get(transaction=transaction)
+    if snapshot.exists:
+        return snapshot.to_dict()
+    
+    memberships = await db.collection("group_members").where("userId", "==", uid).get(transaction=transaction)
+    # Without any logs yet there is nothing to backfill: every rollup is written on log
+    any_log = await db.collection("habit_logs").where("uid", "==", uid).limit(1).get(transaction=transaction)
+    return {
+        "uid": uid,
+        "days": await _window_day_counts(uid, transaction) if any_log else {},
+        "groupIds": [membership.get("groupId") for membership in memberships],
+        "rollupsComplete": not any_log
+    }
+
+def _activity_doc(activity: Dict[str, Any], days: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "uid": activity["uid"],
+        "days": days,
+        "groupIds": activity["groupIds"],
+        "rollupsComplete": activity.get("rollupsComplete", False),
+        "updatedAt": firestore.SERVER_TIMESTAMP
+    }
+
+def _record_activity(transaction, activity: Dict[str, Any], timestamps: List[datetime]) -> None:
+    """Add new log timestamps to the user's counters and fan them out to their groups"""
+    uid = activity["uid"]
+    days = add_day_counts(activity.get("days", {}), timestamps, leaderboard_window_start().date())
+    activity["days"] = days
+    
+    transaction.set(db.collection("user_activity").document(uid), _activity_doc(activity, days))
+    
+    days_path = db.field_path("members", uid, "days")
+    for group_id in activity["groupIds"]:
+        transaction.set(
+            db.collection("group_leaderboards").document(group_id),
+            {"members": {uid: {"days": days}}, "updatedAt": firestore.SERVER_TIMESTAMP},
+            merge=[days_path, "updatedAt"]
+        )
+
+def _track_group(transaction, group_id: str, activity: Dict[str, Any]) -> Dict[str, int]:
+    """Add a group to the user's activity doc; returns the user's current day counts"""
+    uid = activity["uid"]
+    if group_id not in activity["groupIds"]:
+        activity["groupIds"].append(group_id)
+    
+    days = add_day_counts(activity.get("days", {}), [], leaderboard_window_start().date())
+    transaction.set(db.collection("user_activity").document(uid), _activity_doc(activity, days))
+    return days
+
+async def _refresh_member_names(uid: str, display_name: Optional[str]) -> None:
+    """Write a user's display name into the leaderboard of every group they belong to"""
+    group_ids = list(await get_user_memberships(uid))
+    if not group_ids:
+        return
+    
+    name_path = db.field_path("members", uid, "displayName")
+    for i in range(0, len(group_ids), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for group_id in group_ids[i:i + MAX_BATCH_WRITES]:
+            batch.set(
+                db.collection("group_leaderboards").document(group_id),
+                {"members": {uid: {"displayName": display_name}}, "updatedAt": firestore.SERVER_TIMESTAMP},
+                merge=[name_path, "updatedAt"]
+            )
+        async with db_slot():
+            await batch.commit()
+    await response_cache.invalidate(*map(group_scope, group_ids))
+
+async def is_group_member(group_id: str, uid: str) -> bool:
+    """
+    Whether a user belongs to a group. Cached lists only answer yes: one may
+    predate a join on another worker, so anything else is settled by the
+    user's group_members doc.
+    """
+    members = membership_cache.group_members(group_id)
+    if members is not None and uid in members:
+        return True
+    groups = membership_cache.user_groups(uid)
+    if groups is not None and group_id in groups:
+        return True
+    
+    async with db_slot():
+        member_doc = await db.collection("group_members").document(f"{group_id}_{uid}").get()
+    return member_doc.exists
+
+async def get_group_leaderboard(group_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get a group's materialized leaderboard ({groupName, members: {uid: {...}}}),
+    rebuilding it from raw data if it has never been built
+    """
+    async with db_slot():
+        snapshot = await db.collection("group_leaderboards").document(group_id).get()
+    
+    version = membership_cache.version()
+    board = snapshot.to_dict() if snapshot.exists else None
+    if board is None or not board.get("built"):
+        board = await rebuild_group_leaderboard(group_id)
+    else:
+        # Every membership write also writes the board, so it lists the members
+        membership_cache.put_group(
+            group_id, {uid: member.get("role") for uid, member in board["members"].items()}, version
+        )
+    return board
+
+async def rebuild_group_leaderboard(group_id: str, unchanged_since: datetime = None) -> Optional[Dict[str, Any]]:
+    """
+    Recompute a group's leaderboard document from members, users and activity.
+    Everything is read in the transaction that replaces the board, so a join
+    or log committing meanwhile makes it retry instead of being dropped.
+    With unchanged_since, a board written after that time is left alone.
+    Returns the new board, or None if the group doesn't exist or was skipped.
+    """
+    version = membership_cache.version()
+    board = await run_transaction(_rebuild_leaderboard, group_id, unchanged_since)
+    if board is not None:
+        membership_cache.put_group(
+            group_id, {uid: member["role"] for uid, member in board["members"].items()}, version
+        )
+    return board
+
+async def _rebuild_leaderboard(transaction, group_id: str, unchanged_since: Optional[datetime]) -> Optional[Dict[str, Any]]:
+    board_ref = db.collection("group_leaderboards").document(group_id)
+    if unchanged_since is not None:
+        stored = await board_ref.get(transaction=transaction)
+        updated_at = stored.to_dict().get("updatedAt") if stored.exists else None
+        if updated_at is not None and updated_at > unchanged_since:
+            return None
+    
+    group_doc = await db.collection("groups").document(group_id).get(transaction=transaction)
+    if not group_doc.exists:
+        return None
+    
+    # Read fresh rather than from the membership cache: the result is persisted
+    memberships = await db.collection("group_members").where("groupId", "==", group_id).get(transaction=transaction)
+    roles = {membership.get("userId"): membership.get("role") for membership in memberships}
+    
+    # Users and activity docs for every member in one batched read
+    refs = [db.collection("users").document(uid) for uid in roles]
+    refs += [db.collection("user_activity").document(uid) for uid in roles]
+    users, activities = {}, {}
+    async for doc in db.get_all(refs, transaction=transaction):
+        if doc.exists:
+            target = users if doc.reference.parent.id == "users" else activities
+            target[doc.id] = doc.to_dict()
+    
+    # Members who have not logged since counters existed are counted from raw logs
+    window_start = leaderboard_window_start().date()
+    days = {uid: add_day_counts(activity.get("days", {}), [], window_start) for uid, activity in activities.items()}
+    uncounted = [uid for uid in roles if uid not in days]
+    counted = await asyncio.gather(*(_window_day_counts(uid, transaction) for uid in uncounted))
+    for uid, counts in zip(uncounted, counted):
+        days[uid] = counts
+    
+    board = {
+        "groupId": group_id,
+        "groupName": group_doc.get("name"),
+        "built": True,
+        "members": {
+            uid: {
+                "displayName": users.get(uid, {}).get("displayName"),
+                "role": role,
+                "days": days[uid]
+            }
+            for uid, role in roles.items()
+        },
+        "updatedAt": firestore.SERVER_TIMESTAMP
+    }
+    transaction.set(board_ref, board)
+    return board
+
+def logs_window_start(days: int) -> datetime:
+    """Midnight (UTC) N days ago"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days)
+
+def _habit_logs_query(uid: str, habit_type: HabitType = None, days: int = 7):
+    """Logs for the last N days, newest first, with the doc id as tie-breaker;
+    only the fields a HabitLogRecord needs are read"""
     query = db.collection("habit_logs").where("uid", "==", uid)
     
     if habit_type:
         query = query.where("habitType", "==", habit_type.value)
     
     # Get logs from last N days
-    start_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    start_date = start_date.replace(day=start_date.day - days)
-    query = query.where("timestamp", ">=", start_date)
+    query = query.where("timestamp", ">=", logs_window_start(days))
+    
+    return (query
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .order_by("__name__", direction=firestore.Query.DESCENDING)
+            .select(HABIT_LOG_FIELDS))
+
+def encode_logs_cursor(timestamp: datetime, log_id: str) -> str:
+    """Opaque keyset cursor for the (timestamp, id) of the last log on a page"""
+    raw = json.dumps({"t": timestamp.isoformat(), "id": log_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_logs_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_logs_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(raw["t"]), str(raw["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+async def get_habit_logs(uid: str, habit_type: HabitType = None, days: int = 7) -> List[HabitLogRecord]:
+    """Get habit logs for a user"""
+    docs = _habit_logs_query(uid, habit_type, days).stream()
     
-    docs = query.order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
+    async with db_slot():
+        return [HabitLogRecord.from_snapshot(doc) async for doc in docs]
+
+async def get_habit_logs_page(uid: str, habit_type: HabitType = None, days: int = 7,
+                              page_size: int = 100, cursor: str = None) -> Tuple[List[HabitLogRecord], Optional[str]]:
+    """
+    Get one page of habit logs using keyset pagination on (timestamp, id).
+    Returns (logs, next_cursor); next_cursor is None on the last page.
+    """
+    query = _habit_logs_query(uid, habit_type, days)
+    if cursor:
+        timestamp, log_id = decode_logs_cursor(cursor)
+        query = query.start_after({"timestamp": timestamp, "__name__": log_id})
     
-    logs = []
-    for doc in docs:
-        log_data = doc.to_dict()
-        log_data["id"] = doc.id
-        logs.append(log_data)
+    # Fetch one extra log to know whether another page exists
+    async with db_slot():
+        logs = [HabitLogRecord.from_snapshot(doc) async for doc in query.limit(page_size + 1).stream()]
     
-    return logs
+    next_cursor = None
+    if len(logs) > page_size:
+        logs = logs[:page_size]
+        next_cursor = encode_logs_cursor(logs[-1].timestamp, logs[-1].id)
+    return logs, next_cursor
+
+async def stream_habit_logs(uid: str, habit_type: HabitType = None, days: int = 7,
+                            page_size: int = 500) -> AsyncIterator[HabitLogRecord]:
+    """
+    Yield habit logs page by page so memory stays bounded however large the
+    window is. Each page is read under db_slot() and the slot is released
+    before its logs are yielded, so a slow consumer never holds one.
+    """
+    query = _habit_logs_query(uid, habit_type, days)
+    page = query
+    while True:
+        async with db_slot():
+            logs = [HabitLogRecord.from_snapshot(doc) async for doc in page.limit(page_size).stream()]
+        for log in logs:
+            yield log
+        if len(logs) < page_size:
+            return
+        page = query.start_after({"timestamp": logs[-1].timestamp, "__name__": logs[-1].id})
 
 async def get_streak(uid: str, habit_type: HabitType) -> Dict[str, Any]:
-    """Calculate streak for a habit"""
-    # Get all logs for this habit (limit to last 60 days for performance)
-    start_date = datetime.utcnow().replace(day=datetime.utcnow().day - 60)
+    """Get streak for a habit from its incrementally maintained state"""
+    async with db_slot():
+        snapshot = await _streak_ref(uid, habit_type).get()
+    
+    if snapshot.exists:
+        state = snapshot.to_dict()
+    else:
+        state = await run_transaction(_rebuild_streak, uid, habit_type)
+    
+    return {
+        "habit_type": habit_type.value,
+        "current_streak": current_streak(state, datetime.utcnow().date()),
+        "best_streak": state["bestRun"],
+        "updated_at": datetime.utcnow()
+    }
+
+async def summarize_habits(uid: str, days: int = 7, recent: int = 5) -> Dict[str, Dict[str, Any]]:
+    """
+    Summarize every habit type for a user: one logs query for the window,
+    partitioned in memory, plus one batched read of all streak docs
+    """
+    logs_query = (db.collection("habit_logs")
+                  .where("uid", "==", uid)
+                  .where("timestamp", ">=", logs_window_start(days))
+                  .order_by("timestamp", direction=firestore.Query.DESCENDING)
+                  .select(HABIT_LOG_FIELDS))
+    
+    async def fetch_logs():
+        async with db_slot():
+            return [doc async for doc in logs_query.stream()]
+    
+    async def fetch_streaks():
+        refs = [_streak_ref(uid, habit_type) for habit_type in HabitType]
+        async with db_slot():
+            return {doc.id: doc async for doc in db.get_all(refs)}
+    
+    log_docs, streak_docs = await asyncio.gather(fetch_logs(), fetch_streaks())
+    
+    summary = {
+        habit_type.value: {"total_entries": 0, "recent_logs": []}
+        for habit_type in HabitType
+    }
+    for doc in log_docs:
+        entry = summary.get(doc.to_dict()["habitType"])
+        if entry is None:
+            continue
+        entry["total_entries"] += 1
+        if len(entry["recent_logs"]) < recent:
+            entry["recent_logs"].append(HabitLogRecord.from_snapshot(doc))
+    
+    # Habits never logged since streak state existed are built once, concurrently
+    states = {}
+    missing = []
+    for habit_type in HabitType:
+        doc = streak_docs.get(_streak_ref(uid, habit_type).id)
+        if doc is not None and doc.exists:
+            states[habit_type] = doc.to_dict()
+        else:
+            missing.append(habit_type)
+    rebuilt = await asyncio.gather(*(run_transaction(_rebuild_streak, uid, habit_type) for habit_type in missing))
+    states.update(zip(missing, rebuilt))
+    
+    today = datetime.utcnow().date()
+    for habit_type, state in states.items():
+        summary[habit_type.value]["current_streak"] = current_streak(state, today)
+        summary[habit_type.value]["best_streak"] = state["bestRun"]
+    
+    return summary
+
+# Streak state
+#
+# habit_streaks/{uid}_{habitType} holds the latest run of consecutive days and
+# the best run ever, updated in O(1) by every log write. Only a log dated
+# before the latest run forces a rebuild from the full history.
+def _streak_ref(uid: str, habit_type: HabitType):
+    return db.collection("habit_streaks").document(f"{uid}_{habit_type.value}")
+
+async def _habit_dates(transaction, uid: str, habit_type: HabitType, rollups_complete: bool = False) -> List[date]:
+    """
+    Every date a habit was logged, read inside a transaction: one doc per
+    active day from daily_rollups once they cover the user's whole history,
+    otherwise from raw habit_logs
+    """
+    if rollups_complete:
+        query = (db.collection("daily_rollups")
+                 .where("uid", "==", uid)
+                 .select(["day", f"habits.{habit_type.value}.count"]))
+        docs = await query.get(transaction=transaction)
+        return [parse_day_key(doc.get("day")) for doc in docs
+                if (doc.to_dict().get("habits") or {}).get(habit_type.value)]
     
     query = (db.collection("habit_logs")
              .where("uid", "==", uid)
              .where("habitType", "==", habit_type.value)
-             .where("timestamp", ">=", start_date)
-             .order_by("timestamp"))
+             .select(["timestamp"]))
+    docs = await query.get(transaction=transaction)
+    return [to_utc_date(doc.get("timestamp")) for doc in docs]
+
+async def _next_streak(transaction, uid: str, habit_type: HabitType, new_dates: List[date],
+                       rollups_complete: bool = False) -> Dict[str, Any]:
+    """Read a habit's streak state and apply newly logged dates to it"""
+    snapshot = await _streak_ref(uid, habit_type).get(transaction=transaction)
+    state = snapshot.to_dict() if snapshot.exists else None
+    
+    for day in sorted(new_dates):
+        if state is None:
+            break
+        state = advance_streak(state, day)
+    
+    if state is None:
+        history = await _habit_dates(transaction, uid, habit_type, rollups_complete)
+        state = streak_state(history + new_dates)
+    return state
+
+def _write_streak(transaction, uid: str, habit_type: HabitType, state: Dict[str, Any]) -> None:
+    transaction.set(_streak_ref(uid, habit_type), {
+        "uid": uid,
+        "habitType": habit_type.value,
+        "runStartDay": state["runStartDay"],
+        "lastDay": state["lastDay"],
+        "currentRun": state["currentRun"],
+        "bestRun": state["bestRun"],
+        "updatedAt": firestore.SERVER_TIMESTAMP
+    })
+
+async def _rebuild_streak(transaction, uid: str, habit_type: HabitType) -> Dict[str, Any]:
+    """Create a habit's streak state from its full log history"""
+    activity = await db.collection("user_activity").document(uid).get(transaction=transaction)
+    rollups_complete = bool(activity.exists and activity.to_dict().get("rollupsComplete"))
+    state = await _next_streak(transaction, uid, habit_type, [], rollups_complete)
+    _write_streak(transaction, uid, habit_type, state)
+    return state
+
+# Daily rollups
+#
+# daily_rollups/{uid}_{YYYYMMDD} holds a user's log count for the day plus
+# count/sum/min/max of the values per habit type. Log writes maintain them with
+# field transforms; history from before they existed is filled in by
+# backfill_daily_rollups, which sets user_activity.rollupsComplete once done.
+def _rollup_ref(uid: str, key: str):
+    return db.collection("daily_rollups").document(f"{uid}_{key}")
+
+def _group_by_day(logs: List[Dict[str, Any]]) -> Dict[str, Dict[str, List[float]]]:
+    """{day_key: {habitType: [values]}} for log dicts"""
+    days = {}
+    for log_data in logs:
+        habits = days.setdefault(day_key(to_utc_date(log_data["timestamp"])), {})
+        habits.setdefault(log_data["habitType"], []).append(log_data.get("value") or 0)
+    return days
+
+def _record_rollups(transaction, uid: str, logs: List[Dict[str, Any]]) -> None:
+    """Fold new logs into their day docs without reading them"""
+    for key, habits in _group_by_day(logs).items():
+        transaction.set(_rollup_ref(uid, key), {
+            "uid": uid,
+            "day": key,
+            "count": firestore.Increment(sum(len(values) for values in habits.values())),
+            "habits": {
+                habit: {
+                    "count": firestore.Increment(len(values)),
+                    "sum": firestore.Increment(sum(values)),
+                    "min": firestore.Minimum(min(values)),
+                    "max": firestore.Maximum(max(values))
+                }
+                for habit, values in habits.items()
+            },
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        }, merge=True)
+
+async def backfill_daily_rollups(uid: str) -> int:
+    """
+    Rebuild a user's daily rollups from raw habit_logs, ROLLUP_BACKFILL_DAYS
+    active days per transaction, then mark them complete so streak rebuilds
+    read day docs. Safe while the user keeps logging: every chunk reads the
+    user's activity doc, which each log write also updates, so the two are
+    serialized. Returns the number of day docs written.
+    """
+    written = 0
+    start = None
+    while True:
+        start, days = await run_transaction(_backfill_rollup_chunk, uid, start)
+        written += days
+        if start is None:
+            return written
+
+async def _backfill_rollup_chunk(transaction, uid: str, start: Optional[datetime]) -> Tuple[Optional[datetime], int]:
+    """Rewrite the day docs of up to ROLLUP_BACKFILL_DAYS days from start; returns where the next chunk starts"""
+    activity = await _load_activity(transaction, uid)
     
-    docs = query.stream()
+    query = (db.collection("habit_logs")
+             .where("uid", "==", uid)
+             .order_by("timestamp")
+             .select(["habitType", "value", "timestamp"]))
+    if start is not None:
+        query = query.where("timestamp", ">=", start)
     
-    # Extract dates (convert datetime to date)
-    habit_dates = []
-    for doc in docs:
-        log_data = doc.to_dict()
-        log_date = log_data["timestamp"].date() if hasattr(log_data["timestamp"], 'date') else log_data["timestamp"]
-        habit_dates.append(log_date)
+    logs = []
+    next_start = None
+    seen_days = set()
+    stream = query.stream(transaction=transaction)
+    try:
+        async for doc in stream:
+            log_data = doc.to_dict()
+            day = to_utc_date(log_data["timestamp"])
+            if day not in seen_days and len(seen_days) == ROLLUP_BACKFILL_DAYS:
+                next_start = datetime.combine(day, time.min)
+                break
+            seen_days.add(day)
+            logs.append(log_data)
+    finally:
+        await stream.aclose()
     
-    # Remove duplicates and compute streaks
-    unique_dates = list(set(habit_dates))
-    current_streak, best_streak = compute_streak(unique_dates)
+    days = _group_by_day(logs)
+    for key, habits in days.items():
+        transaction.set(_rollup_ref(uid, key), {
+            "uid": uid,
+            "day": key,
+            "count": sum(len(values) for values in habits.values()),
+            "habits": {
+                habit: {"count": len(values), "sum": sum(values), "min": min(values), "max": max(values)}
+                for habit, values in habits.items()
+            },
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        })
     
-    return {
-        "habit_type": habit_type.value,
-        "current_streak": current_streak,
-        "best_streak": best_streak,
-        "updated_at": datetime.utcnow()
-    }
+    if next_start is None:
+        activity["rollupsComplete"] = True
+        days_counts = add_day_counts(activity.get("days", {}), [], leaderboard_window_start().date())
+        transaction.set(db.collection("user_activity").document(uid), _activity_doc(activity, days_counts))
+    return next_start, len(days)
+
+async def backfill_all_rollups(concurrency: int = 8) -> Dict[str, int]:
+    """Backfill every user in the users collection; returns {uid: day docs written}"""
+    async with db_slot():
+        user_docs = await db.collection("users").select([]).get()
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def backfill(uid: str) -> int:
+        async with semaphore:
+            return await backfill_daily_rollups(uid)
+    
+    uids = [doc.id for doc in user_docs]
+    return dict(zip(uids, await asyncio.gather(*(backfill(uid) for uid in uids))))
 
 # Group CRUD operations
 async def create_group(name: str, owner_id: str) -> Dict[str, Any]:
     """Create a new group"""
-    join_code = generate_join_code()
-    
     group_data = {
         "name": name,
         "ownerId": owner_id,
-        "joinCode": join_code,
+        "joinCode": None,
+        "memberCount": 1,
         "createdAt": firestore.SERVER_TIMESTAMP
     }
     
-    # Create group document
     group_ref = db.collection("groups").document()
-    group_ref.set(group_data)
     
     # Add owner as first member
     member_data = {
@@ -132,32 +753,247 @@ async def create_group(name: str, owner_id: str) -> Dict[str, Any]:
         "joinedAt": firestore.SERVER_TIMESTAMP
     }
     
-    db.collection("group_members").document(f"{group_ref.id}_{owner_id}").set(member_data)
+    await run_transaction(_write_group, group_ref, group_data, member_data)
+    _remember_join_code(group_data["joinCode"], group_ref.id)
+    membership_cache.add(group_ref.id, owner_id, GroupRole.OWNER.value)
+    await response_cache.invalidate(user_scope(owner_id))
     
     group_data["id"] = group_ref.id
+    # The stored value is the server's commit time; callers get a close local stand-in
+    group_data["createdAt"] = datetime.utcnow()
     return group_data
 
+async def _write_group(transaction, group_ref, group_data: Dict[str, Any], member_data: Dict[str, Any]) -> None:
+    """Create a group, its join code, owner membership and leaderboard atomically"""
+    group_data["joinCode"] = await _allocate_join_code(transaction)
+    owner_id = member_data["userId"]
+    owner_doc = await db.collection("users").document(owner_id).get(transaction=transaction)
+    activity = await _load_activity(transaction, owner_id)
+    
+    transaction.set(group_ref, group_data)
+    transaction.create(_join_code_ref(group_data["joinCode"]), {
+        "groupId": group_ref.id,
+        "createdAt": firestore.SERVER_TIMESTAMP
+    })
+    transaction.set(db.collection("group_members").document(f"{group_ref.id}_{owner_id}"), member_data)
+    days = _track_group(transaction, group_ref.id, activity)
+    transaction.set(db.collection("group_leaderboards").document(group_ref.id), {
+        "groupId": group_ref.id,
+        "groupName": group_data["name"],
+        "built": True,
+        "members": {
+            owner_id: {
+                "displayName": owner_doc.get("displayName") if owner_doc.exists else None,
+                "role": GroupRole.OWNER.value,
+                "days": days
+            }
+        },
+        "updatedAt": firestore.SERVER_TIMESTAMP
+    })
+
 async def join_group(join_code: str, user_id: str) -> Optional[Dict[str, Any]]:
     """Join a group by join code"""
-    # Find group by join code
-    groups = db.collection("groups").where("joinCode", "==", join_code).limit(1).stream()
+    group_id = await _resolve_join_code(join_code)
+    if group_id is None:
+        return None
     
-    group_doc = next(groups, None)
-    if not group_doc:
+    added, group_data = await run_transaction(_add_member, db.collection("groups").document(group_id), user_id)
+    if group_data is None:
         return None
+    if added:
+        membership_cache.add(group_id, user_id, GroupRole.MEMBER.value)
+        await response_cache.invalidate(user_scope(user_id), group_scope(group_id))
+    
+    group_data["id"] = group_id
+    return group_data
+
+async def _add_member(transaction, group_ref, user_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    Add a member and bump the group's memberCount. Returns whether the user
+    was added (False if already a member) and the group's data (None if the
+    group does not exist).
+    """
+    member_ref = db.collection("group_members").document(f"{group_ref.id}_{user_id}")
+    docs = {doc.reference.parent.id: doc async for doc in db.get_all([member_ref, group_ref], transaction=transaction)}
+    member_doc, group_doc = docs["group_members"], docs["groups"]
+    if not group_doc.exists:
+        return False, None
+    if member_doc.exists:
+        return False, group_doc.to_dict()
     
-    group_id = group_doc.id
+    user_doc = await db.collection("users").document(user_id).get(transaction=transaction)
+    activity = await _load_activity(transaction, user_id)
     
-    # Add user as member
     member_data = {
-        "groupId": group_id,
+        "groupId": group_ref.id,
         "userId": user_id,
         "role": GroupRole.MEMBER.value,
         "joinedAt": firestore.SERVER_TIMESTAMP
     }
+    transaction.set(member_ref, member_data)
     
-    db.collection("group_members").document(f"{group_id}_{user_id}").set(member_data, merge=True)
+    # Groups created before memberCount existed are counted on read instead
+    if "memberCount" in group_doc.to_dict():
+        transaction.update(group_ref, {"memberCount": firestore.Increment(1)})
     
-    group_data = group_doc.to_dict()
-    group_data["id"] = group_id
-    return group_data
+    days = _track_group(transaction, group_ref.id, activity)
+    transaction.set(
+        db.collection("group_leaderboards").document(group_ref.id),
+        {"members": {user_id: {
+            "displayName": user_doc.get("displayName") if user_doc.exists else None,
+            "role": GroupRole.MEMBER.value,
+            "days": days
+        }}, "updatedAt": firestore.SERVER_TIMESTAMP},
+        merge=[db.field_path("members", user_id), "updatedAt"]
+    )
+    return True, group_doc.to_dict()
+
+# Join codes
+#
+# join_codes/{code} maps each code to its group, so a join is one document get
+# and uniqueness is enforced when the code is allocated. Codes never move
+# between groups, so recently used ones are also kept in memory.
+_join_code_cache: "OrderedDict[str, str]" = OrderedDict()
+
+def _join_code_ref(join_code: str):
+    return db.collection("join_codes").document(join_code)
+
+def _remember_join_code(join_code: str, group_id: str) -> None:
+    _join_code_cache[join_code] = group_id
+    _join_code_cache.move_to_end(join_code)
+    while len(_join_code_cache) > JOIN_CODE_CACHE_SIZE:
+        _join_code_cache.popitem(last=False)
+
+async def _allocate_join_code(transaction) -> str:
+    """
+    Draw random codes until one is free. The checks are read in the
+    transaction, so two groups can never commit the same code.
+    """
+    for _ in range(JOIN_CODE_ATTEMPTS):
+        join_code = generate_join_code()
+        snapshot = await _join_code_ref(join_code).get(transaction=transaction)
+        if snapshot.exists:
+            continue
+        # Groups created before the index may hold the code without an entry
+        legacy = await db.collection("groups").where("joinCode", "==", join_code).limit(1).get(transaction=transaction)
+        if not legacy:
+            return join_code
+    raise RuntimeError("Could not allocate a free join code")
+
+async def _resolve_join_code(join_code: str) -> Optional[str]:
+    """Group id for a join code, or None if no group uses it"""
+    group_id = _join_code_cache.get(join_code)
+    if group_id is not None:
+        _join_code_cache.move_to_end(join_code)
+        return group_id
+    
+    async with db_slot():
+        snapshot = await _join_code_ref(join_code).get()
+    if snapshot.exists:
+        group_id = snapshot.get("groupId")
+    else:
+        # Groups created before the index are found by query once, then indexed
+        async with db_slot():
+            groups = await db.collection("groups").where("joinCode", "==", join_code).limit(1).get()
+        if not groups:
+            return None
+        group_id = groups[0].id
+        async with db_slot():
+            await _join_code_ref(join_code).set({"groupId": group_id, "createdAt": firestore.SERVER_TIMESTAMP})
+    
+    _remember_join_code(join_code, group_id)
+    return group_id
+
+async def backfill_join_codes() -> int:
+    """Index the join codes of groups created before join_codes existed; returns codes added"""
+    async with db_slot():
+        group_docs = await db.collection("groups").select(["joinCode"]).get()
+    # Duplicate legacy codes resolve to the first group, as the old query did
+    codes = {}
+    for doc in group_docs:
+        if doc.to_dict().get("joinCode"):
+            codes.setdefault(doc.get("joinCode"), doc.id)
+    
+    added = 0
+    items = list(codes.items())
+    for i in range(0, len(items), MAX_BATCH_WRITES):
+        chunk = items[i:i + MAX_BATCH_WRITES]
+        async with db_slot():
+            existing = {doc.id async for doc in db.get_all([_join_code_ref(code) for code, _ in chunk]) if doc.exists}
+        missing = [(code, group_id) for code, group_id in chunk if code not in existing]
+        if not missing:
+            continue
+        batch = db.batch()
+        for code, group_id in missing:
+            batch.set(_join_code_ref(code), {"groupId": group_id, "createdAt": firestore.SERVER_TIMESTAMP})
+        async with db_slot():
+            await batch.commit()
+        added += len(missing)
+    return added
+
+async def count_group_members(group_id: str, transaction=None) -> int:
+    """Count a group's members with a server-side aggregation"""
+    return await aggregation.count(db.collection("group_members").where("groupId", "==", group_id), transaction)
+
+async def _backfill_member_count(transaction, group_ref) -> int:
+    """
+    Store a legacy group's memberCount unless it has been set meanwhile. The
+    count is read in the transaction, so a join committing alongside makes it
+    retry instead of leaving a count one short.
+    """
+    snapshot = await group_ref.get(transaction=transaction)
+    stored = snapshot.to_dict().get("memberCount") if snapshot.exists else None
+    if stored is not None:
+        return stored
+    
+    member_count = await count_group_members(group_ref.id, transaction)
+    if snapshot.exists:
+        transaction.update(group_ref, {"memberCount": member_count})
+    return member_count
+
+async def get_user_memberships(uid: str) -> Dict[str, str]:
+    """{group_id: role} for every group a user belongs to, from the membership cache when fresh"""
+    roles = membership_cache.user_groups(uid)
+    if roles is None:
+        version = membership_cache.version()
+        async with db_slot():
+            memberships = await db.collection("group_members").where("userId", "==", uid).get()
+        roles = {membership.get("groupId"): membership.get("role") for membership in memberships}
+        membership_cache.put_user(uid, roles, version)
+    return roles
+
+async def get_user_groups(uid: str) -> List[Dict[str, Any]]:
+    """Get all groups a user belongs to, with member counts and the user's role"""
+    roles = await get_user_memberships(uid)
+    if not roles:
+        return []
+    
+    # Fetch every group document in one batched read
+    refs = [db.collection("groups").document(group_id) for group_id in roles]
+    group_docs = {}
+    async with db_slot():
+        async for doc in db.get_all(refs):
+            if doc.exists:
+                group_docs[doc.id] = doc
+    
+    groups = []
+    for group_id, role in roles.items():
+        doc = group_docs.get(group_id)
+        if doc is None:
+            continue
+        group_data = doc.to_dict()
+        group_data["id"] = group_id
+        group_data["member_count"] = group_data.get("memberCount")
+        group_data["my_role"] = role
+        groups.append(group_data)
+    
+    # Legacy groups without a denormalized count: count and backfill concurrently
+    uncounted = {group["id"]: group for group in groups if group["member_count"] is None}
+    counts = await aggregation.aggregate_many({
+        group_id: run_transaction(_backfill_member_count, db.collection("groups").document(group_id))
+        for group_id in uncounted
+    })
+    for group_id, count in counts.items():
+        uncounted[group_id]["member_count"] = count
+    
+    return groups
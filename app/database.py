@@ -1,28 +1,109 @@
+import asyncio
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Initialize Firebase Admin SDK (only once)
-if not firebase_admin._apps:
-    # Get the path to service account key from environment
-    service_account_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-    
-    if not service_account_path:
-        raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
-    
-    # Initialize Firebase Admin with service account
-    cred = credentials.Certificate(service_account_path)
-    firebase_admin.initialize_app(cred, {
-        'projectId': os.getenv("FIREBASE_PROJECT_ID", "student-wellness-backend")
-    })
-
-# Create Firestore client
-db = firestore.Client()
+
+from app import instrumentation
+
+# "firestore" (default) or "memory" for the local engine used in dev/load tests
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+
+# Maximum number of Firestore calls allowed in flight per worker
+MAX_CONCURRENCY = int(os.getenv("FIRESTORE_MAX_CONCURRENCY", "64"))
+
+_limiter = None
+
+# The backend client, and what callers get: the same client behind the
+# instrumentation wrapper so every round trip is attributed to the request
+# that made it (see instrumentation.py). Both are created by connect().
+db = None
+_client = None
+
+def firebase_app():
+    """Initialize the Firebase Admin SDK (only once) and return its default app"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    if not firebase_admin._apps:
+        # Get the path to service account key from environment
+        service_account_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+
+        if not service_account_path:
+            raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
+
+        # Initialize Firebase Admin with service account
+        cred = credentials.Certificate(service_account_path)
+        firebase_admin.initialize_app(cred, {
+            'projectId': os.getenv("FIREBASE_PROJECT_ID", "student-wellness-backend")
+        })
+    return firebase_admin.get_app()
+
+def connect():
+    """
+    Create the database client if it does not exist yet and return it.
+
+    The app lifespan calls this at startup, so each worker process builds its
+    own client (and gRPC channels) after any fork; anything else connects on
+    first use. Importing this module creates no client and loads neither
+    firebase_admin nor the storage engine.
+    """
+    global db, _client
+    if _client is not None:
+        return _client
+
+    if STORAGE_BACKEND == "memory":
+        from app.storage.memory import MemoryClient
+
+        db = MemoryClient()
+    elif STORAGE_BACKEND == "firestore":
+        from firebase_admin import firestore_async
+
+        # Async Firestore client so queries don't block the event loop
+        db = firestore_async.client(firebase_app())
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+    _client = instrumentation.InstrumentedClient(db) if instrumentation.ENABLED else db
+    return _client
+
+class _LazyClient:
+    """Stand-in handed out before connect(); every attribute access connects first"""
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(connect(), name)
+
+_lazy_client = _LazyClient()
 
 # Helper function to get database instance
 def get_db():
-    return db
+    return _client if _client is not None else _lazy_client
+
+def db_slot() -> asyncio.Semaphore:
+    """Get the semaphore that bounds concurrent Firestore calls.
+
+    Usage: ``async with db_slot(): doc = await ref.get()``
+    """
+    global _limiter
+    if _limiter is None:
+        _limiter = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _limiter
+
+async def run_transaction(fn, *args, **kwargs):
+    """Run ``fn(transaction, *args, **kwargs)`` in a Firestore transaction.
+
+    The coroutine is retried automatically when the commit hits contention.
+    It runs inside a db_slot(), so it must not acquire one itself.
+    """
+    connect()
+    async with db_slot():
+        if instrumentation.ENABLED:
+            return await instrumentation.run_transaction(_run_transaction, fn, *args, **kwargs)
+        return await _run_transaction(fn, *args, **kwargs)
+
+async def _run_transaction(fn, *args, **kwargs):
+    if STORAGE_BACKEND == "memory":
+        # The local engine serializes transactions itself
+        return await db.run_transaction(fn, *args, **kwargs)
+    from google.cloud import firestore
+
+    return await firestore.async_transactional(fn)(db.transaction(), *args, **kwargs)
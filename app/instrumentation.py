@@ -0,0 +1,527 @@
+"""
+Per-request Firestore instrumentation.
+
+database.get_db() hands out an InstrumentedClient wrapping the real client
+(or the memory engine). Every round trip made through it is timed and
+attributed to the request being served, which FirestoreMetricsMiddleware
+tracks in a ContextVar. The numbers are then:
+
+- returned on the response as X-Firestore-* and Server-Timing headers
+- aggregated per route for the Prometheus /metrics endpoint
+- kept as per-route sampled profiles (every call, in order) when
+  PROFILE_SAMPLE_RATE > 0, served from /metrics/profiles
+
+Calls made outside a request (startup, background tasks) are counted under
+the "background" route. Firestore time is summed per call, so it can exceed
+the request's wall time when calls run concurrently. Streaming responses
+send their headers before the body, so the headers only cover the work done
+up to the first byte; /metrics and profiles cover the whole request.
+"""
+import os
+import random
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import MutableHeaders
+
+# Set FIRESTORE_INSTRUMENTATION=0 to hand out the bare client
+ENABLED = os.getenv("FIRESTORE_INSTRUMENTATION", "1") != "0"
+# Fraction of requests whose individual Firestore calls are recorded
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLES_PER_ROUTE = int(os.getenv("PROFILE_SAMPLES_PER_ROUTE", "20"))
+
+# Request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HEADERS = [
+    "X-Firestore-Calls",
+    "X-Firestore-Reads",
+    "X-Firestore-Writes",
+    "X-Firestore-Time-Ms",
+    "Server-Timing",
+]
+
+
+class RequestStats:
+    """Firestore usage of one request"""
+
+    __slots__ = ("calls", "reads", "writes", "seconds", "ops", "trace", "started")
+
+    def __init__(self, trace: bool = False):
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+        self.seconds = 0.0
+        # (op, collection) -> [calls, seconds]
+        self.ops: Dict[tuple, list] = {}
+        self.trace: Optional[List[Dict[str, Any]]] = [] if trace else None
+        self.started = perf_counter()
+
+    def record(self, op: str, collection: str, seconds: float, reads: int, writes: int) -> None:
+        self.calls += 1
+        self.reads += reads
+        self.writes += writes
+        self.seconds += seconds
+        entry = self.ops.get((op, collection))
+        if entry is None:
+            self.ops[(op, collection)] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+        if self.trace is not None:
+            self.trace.append({
+                "op": op,
+                "collection": collection,
+                "at_ms": round((perf_counter() - self.started - seconds) * 1000, 3),
+                "ms": round(seconds * 1000, 3),
+                "reads": reads,
+                "writes": writes,
+            })
+
+
+class Metrics:
+    """Process-wide totals per route, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = defaultdict(int)  # (method, route, status) -> count
+        self.latency = {}  # (method, route) -> [bucket counts..., +Inf, sum]
+        self.calls = defaultdict(int)  # (route, op, collection) -> count
+        self.call_seconds = defaultdict(float)  # (route, op, collection) -> seconds
+        self.reads = defaultdict(int)  # route -> documents read
+        self.writes = defaultdict(int)  # route -> documents written
+        self.profiles = defaultdict(lambda: deque(maxlen=PROFILE_SAMPLES_PER_ROUTE))
+
+    def observe_call(self, route: str, op: str, collection: str, seconds: float, reads: int, writes: int) -> None:
+        self.calls[(route, op, collection)] += 1
+        self.call_seconds[(route, op, collection)] += seconds
+        self.reads[route] += reads
+        self.writes[route] += writes
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        self.requests[(method, route, status)] += 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[len(LATENCY_BUCKETS)] += 1
+        histogram[-1] += seconds
+
+        for (op, collection), (calls, call_seconds) in stats.ops.items():
+            self.calls[(route, op, collection)] += calls
+            self.call_seconds[(route, op, collection)] += call_seconds
+        self.reads[route] += stats.reads
+        self.writes[route] += stats.writes
+
+        if stats.trace is not None:
+            self.profiles[f"{method} {route}"].append({
+                "status": status,
+                "duration_ms": round(seconds * 1000, 3),
+                "firestore_ms": round(stats.seconds * 1000, 3),
+                "calls": stats.calls,
+                "reads": stats.reads,
+                "writes": stats.writes,
+                "ops": stats.trace,
+            })
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "requests": sum(self.requests.values()),
+            "calls": sum(self.calls.values()),
+            "reads": sum(self.reads.values()),
+            "writes": sum(self.writes.values()),
+        }
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        lines = [
+            "# HELP wellness_requests_total HTTP requests served",
+            "# TYPE wellness_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'wellness_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP wellness_request_duration_seconds HTTP request latency",
+            "# TYPE wellness_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                lines.append(f'wellness_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            total = histogram[len(LATENCY_BUCKETS)]
+            lines.append(f'wellness_request_duration_seconds_bucket{{{labels},le="+Inf"}} {total}')
+            lines.append(f"wellness_request_duration_seconds_sum{{{labels}}} {histogram[-1]:.6f}")
+            lines.append(f"wellness_request_duration_seconds_count{{{labels}}} {total}")
+
+        lines += [
+            "# HELP wellness_firestore_calls_total Firestore round trips",
+            "# TYPE wellness_firestore_calls_total counter",
+        ]
+        for (route, op, collection), count in sorted(self.calls.items()):
+            lines.append(f'wellness_firestore_calls_total{{route="{route}",op="{op}",collection="{collection}"}} {count}')
+
+        lines += [
+            "# HELP wellness_firestore_seconds_total Time spent waiting on Firestore",
+            "# TYPE wellness_firestore_seconds_total counter",
+        ]
+        for (route, op, collection), seconds in sorted(self.call_seconds.items()):
+            lines.append(f'wellness_firestore_seconds_total{{route="{route}",op="{op}",collection="{collection}"}} {seconds:.6f}')
+
+        for name, totals, help_text in (
+            ("wellness_firestore_documents_read_total", self.reads, "Documents read (as billed)"),
+            ("wellness_firestore_documents_written_total", self.writes, "Documents written"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for route, count in sorted(totals.items()):
+                lines.append(f'{name}{{route="{route}"}} {count}')
+
+        for name, value in (gauges or {}).items():
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("firestore_request_stats", default=None)
+
+
+def record(op: str, collection: str, seconds: float, reads: int = 0, writes: int = 0) -> None:
+    """Attribute one Firestore round trip to the current request"""
+    stats = _current.get()
+    if stats is None:
+        metrics.observe_call("background", op, collection, seconds, reads, writes)
+    else:
+        stats.record(op, collection, seconds, reads, writes)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# Client wrappers. Anything not intercepted is delegated to the wrapped
+# object, and wrapped references/transactions are unwrapped before they are
+# handed back to the real client.
+
+class _Proxy:
+    __slots__ = ("_wrapped",)
+
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+
+def _unwrap(value):
+    return value._wrapped if isinstance(value, _Proxy) else value
+
+
+def _add_read_time(transaction, seconds: float) -> None:
+    if isinstance(transaction, InstrumentedTransaction):
+        transaction.read_seconds += seconds
+
+
+class InstrumentedSnapshot(_Proxy):
+    __slots__ = ()
+
+    @property
+    def reference(self):
+        reference = self._wrapped.reference
+        return InstrumentedDocument(reference, reference.parent.id)
+
+
+class InstrumentedQuery(_Proxy):
+    __slots__ = ("_collection",)
+
+    def __init__(self, query, collection: str):
+        super().__init__(query)
+        self._collection = collection
+
+    def _chain(self, query) -> "InstrumentedQuery":
+        return InstrumentedQuery(query, self._collection)
+
+    def where(self, *args, **kwargs):
+        return self._chain(self._wrapped.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return self._chain(self._wrapped.order_by(*args, **kwargs))
+
+    def limit(self, *args, **kwargs):
+        return self._chain(self._wrapped.limit(*args, **kwargs))
+
+    def select(self, *args, **kwargs):
+        return self._chain(self._wrapped.select(*args, **kwargs))
+
+    def start_after(self, document_fields):
+        # Snapshot cursors must reach the client as its own snapshot type
+        return self._chain(self._wrapped.start_after(_unwrap(document_fields)))
+
+    def count(self, *args, **kwargs):
+        return InstrumentedAggregation(self._wrapped.count(*args, **kwargs), self._collection)
+
+    async def get(self, transaction=None, **kwargs):
+        start = perf_counter()
+        snapshots = await self._wrapped.get(transaction=_unwrap(transaction), **kwargs)
+        elapsed = perf_counter() - start
+        _add_read_time(transaction, elapsed)
+        # An empty result is still billed as one read
+        record("query.get", self._collection, elapsed, reads=max(1, len(snapshots)))
+        return [InstrumentedSnapshot(snapshot) for snapshot in snapshots]
+
+    async def stream(self, transaction=None, **kwargs):
+        # Only time spent waiting on the store counts, not the consumer's work
+        iterator = self._wrapped.stream(transaction=_unwrap(transaction), **kwargs).__aiter__()
+        elapsed = 0.0
+        documents = 0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    snapshot = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += perf_counter() - start
+                documents += 1
+                yield InstrumentedSnapshot(snapshot)
+        finally:
+            _add_read_time(transaction, elapsed)
+            record("query.stream", self._collection, elapsed, reads=max(1, documents))
+
+
+class InstrumentedCollection(InstrumentedQuery):
+    __slots__ = ()
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._wrapped.document(*args, **kwargs), self._collection)
+
+
+class InstrumentedAggregation(_Proxy):
+    __slots__ = ("_collection",)
+
+    def __init__(self, aggregation, collection: str):
+        super().__init__(aggregation)
+        self._collection = collection
+
+    async def get(self, transaction=None, **kwargs):
+        start = perf_counter()
+        result = await self._wrapped.get(transaction=_unwrap(transaction), **kwargs)
+        elapsed = perf_counter() - start
+        _add_read_time(transaction, elapsed)
+        try:
+            entries = int(result[0][0].value)
+        except (IndexError, TypeError, ValueError):
+            entries = 0
+        # Billed one read per batch of up to 1000 index entries
+        record("aggregation.get", self._collection, elapsed, reads=max(1, -(-entries // 1000)))
+        return result
+
+
+class InstrumentedDocument(_Proxy):
+    __slots__ = ("_collection",)
+
+    def __init__(self, reference, collection: str):
+        super().__init__(reference)
+        self._collection = collection
+
+    def __eq__(self, other):
+        return self._wrapped == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._wrapped)
+
+    async def _write(self, op: str, method: str, *args, **kwargs):
+        start = perf_counter()
+        result = await getattr(self._wrapped, method)(*args, **kwargs)
+        record(op, self._collection, perf_counter() - start, writes=1)
+        return result
+
+    async def get(self, transaction=None, **kwargs):
+        start = perf_counter()
+        snapshot = await self._wrapped.get(transaction=_unwrap(transaction), **kwargs)
+        elapsed = perf_counter() - start
+        _add_read_time(transaction, elapsed)
+        record("doc.get", self._collection, elapsed, reads=1)
+        return InstrumentedSnapshot(snapshot)
+
+    async def set(self, *args, **kwargs):
+        return await self._write("doc.set", "set", *args, **kwargs)
+
+    async def update(self, *args, **kwargs):
+        return await self._write("doc.update", "update", *args, **kwargs)
+
+    async def create(self, *args, **kwargs):
+        return await self._write("doc.create", "create", *args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        return await self._write("doc.delete", "delete", *args, **kwargs)
+
+
+class _BufferedWrites(_Proxy):
+    """Batch/transaction writes: buffered locally, sent in one commit"""
+
+    __slots__ = ("writes",)
+
+    def __init__(self, wrapped):
+        super().__init__(wrapped)
+        self.writes = 0
+
+    def set(self, reference, *args, **kwargs):
+        self.writes += 1
+        return self._wrapped.set(_unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self.writes += 1
+        return self._wrapped.update(_unwrap(reference), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        self.writes += 1
+        return self._wrapped.create(_unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self.writes += 1
+        return self._wrapped.delete(_unwrap(reference), *args, **kwargs)
+
+
+class InstrumentedBatch(_BufferedWrites):
+    __slots__ = ()
+
+    async def commit(self, *args, **kwargs):
+        start = perf_counter()
+        result = await self._wrapped.commit(*args, **kwargs)
+        record("batch.commit", "", perf_counter() - start, writes=self.writes)
+        self.writes = 0
+        return result
+
+
+class InstrumentedTransaction(_BufferedWrites):
+    """Handed to transaction functions by run_transaction (see below)"""
+
+    __slots__ = ("read_seconds",)
+
+    def __init__(self, transaction):
+        super().__init__(transaction)
+        self.read_seconds = 0.0
+
+
+class InstrumentedClient(_Proxy):
+    __slots__ = ()
+
+    def collection(self, collection_id: str, *args, **kwargs):
+        return InstrumentedCollection(self._wrapped.collection(collection_id, *args, **kwargs), collection_id)
+
+    def document(self, document_path: str, *args, **kwargs):
+        return InstrumentedDocument(self._wrapped.document(document_path, *args, **kwargs),
+                                    document_path.split("/", 1)[0])
+
+    def batch(self):
+        return InstrumentedBatch(self._wrapped.batch())
+
+    async def get_all(self, references, *args, transaction=None, **kwargs):
+        references = list(references)
+        collections = sorted({reference._collection for reference in references
+                              if isinstance(reference, InstrumentedDocument)})
+        iterator = self._wrapped.get_all(
+            [_unwrap(reference) for reference in references], *args,
+            transaction=_unwrap(transaction), **kwargs
+        ).__aiter__()
+        elapsed = 0.0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    snapshot = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += perf_counter() - start
+                yield InstrumentedSnapshot(snapshot)
+        finally:
+            _add_read_time(transaction, elapsed)
+            record("get_all", ",".join(collections), elapsed, reads=len(set(references)))
+
+
+async def run_transaction(run, fn, *args, **kwargs):
+    """Call ``run(fn, ...)`` with fn seeing an InstrumentedTransaction.
+
+    Reads inside the transaction are recorded as they happen; the commit is
+    recorded once at the end with the writes of the attempt that committed
+    and the time not already spent on those reads (including retries).
+    """
+    attempts: List[InstrumentedTransaction] = []
+
+    async def attempt(transaction, *a, **k):
+        wrapped = InstrumentedTransaction(transaction)
+        attempts.append(wrapped)
+        return await fn(wrapped, *a, **k)
+
+    start = perf_counter()
+    try:
+        return await run(attempt, *args, **kwargs)
+    finally:
+        elapsed = perf_counter() - start - sum(wrapped.read_seconds for wrapped in attempts)
+        record("transaction.commit", "", max(0.0, elapsed), writes=attempts[-1].writes if attempts else 0)
+
+
+_route_paths: Dict[Any, str] = {}
+
+
+def _route_label(scope) -> str:
+    """The route template that served the request, e.g. /groups/{group_id}/leaderboard"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        # Unmatched paths share one label to keep metric cardinality bounded
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        app = scope.get("app")
+        for route in getattr(app, "routes", []):
+            if getattr(route, "endpoint", None) is endpoint:
+                path = _route_paths[endpoint] = route.path
+                break
+        else:
+            return "unmatched"
+    return path
+
+
+class FirestoreMetricsMiddleware:
+    """ASGI middleware that scopes Firestore stats to each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(trace=PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+        token = _current.set(stats)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                firestore_ms = stats.seconds * 1000
+                headers.append("X-Firestore-Calls", str(stats.calls))
+                headers.append("X-Firestore-Reads", str(stats.reads))
+                headers.append("X-Firestore-Writes", str(stats.writes))
+                headers.append("X-Firestore-Time-Ms", f"{firestore_ms:.1f}")
+                headers.append("Server-Timing", f"firestore;dur={firestore_ms:.1f}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            metrics.observe_request(
+                scope["method"], _route_label(scope), status, perf_counter() - stats.started, stats
+            )
@@ -1,17 +1,28 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import os
-from dotenv import load_dotenv
-import sys
-
-# Add current directory to path for imports
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-# Load environment variables
-load_dotenv()
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
 
 # Import routers
-from routers import auth, habits, groups
+from app.routers import auth, habits, groups
+from app.token_cache import token_cache
+from app.crud import habit_log_queue
+from app.database import connect
+from app.instrumentation import FirestoreMetricsMiddleware, METRIC_HEADERS, metrics
+from app.response_cache import response_cache
+from app.user_cache import user_cache
+from app.membership_cache import membership_cache
+from app.responses import ORJSONResponse
+from app.single_flight import single_flight
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the database client in the worker process, after any fork
+    connect()
+    yield
+    # Write queued habit logs before the worker exits
+    if habit_log_queue is not None:
+        await habit_log_queue.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -19,7 +30,9 @@ app = FastAPI(
     description="Backend API for student wellness tracking with habits, streaks, and group challenges",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -36,8 +49,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=METRIC_HEADERS,
 )
 
+# Per-request Firestore calls/reads/writes/time (headers, /metrics)
+app.add_middleware(FirestoreMetricsMiddleware)
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -55,7 +72,56 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": "2025-09-15"}
+    return {
+        "status": "healthy",
+        "timestamp": "2025-09-15",
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "membership_cache": membership_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "log_queue": habit_log_queue.stats() if habit_log_queue is not None else None,
+        "firestore": metrics.summary()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request latency and Firestore usage per route, Prometheus text format"""
+    cache = token_cache.stats()
+    responses = response_cache.stats()
+    flights = single_flight.stats()
+    gauges = {
+        "wellness_token_cache_hits": cache["hits"],
+        "wellness_token_cache_misses": cache["misses"],
+        "wellness_token_cache_size": cache["size"],
+        "wellness_user_cache_hits": user_cache.stats()["hits"],
+        "wellness_user_cache_misses": user_cache.stats()["misses"],
+        "wellness_response_cache_hits": responses["hits"],
+        "wellness_response_cache_misses": responses["misses"],
+        "wellness_response_cache_invalidations": responses["invalidations"],
+        "wellness_single_flight_executions": flights["executions"],
+        "wellness_single_flight_coalesced": flights["coalesced"],
+        "wellness_single_flight_in_flight": flights["in_flight"],
+    }
+    if habit_log_queue is not None:
+        queue = habit_log_queue.stats()
+        gauges.update({
+            "wellness_log_queue_pending": queue["pending"],
+            "wellness_log_queue_submitted": queue["submitted"],
+            "wellness_log_queue_flushes": queue["flushes"],
+            "wellness_log_queue_failures": queue["failures"],
+            "wellness_log_queue_waits": queue["waits"],
+        })
+    return PlainTextResponse(
+        metrics.render(gauges),
+        media_type="text/plain; version=0.0.4",
+    )
+
+@app.get("/metrics/profiles")
+async def sampled_profiles():
+    """Recently sampled requests per route with every Firestore call they made
+    (enable with PROFILE_SAMPLE_RATE)"""
+    return {route: list(samples) for route, samples in metrics.profiles.items()}
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
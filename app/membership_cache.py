@@ -0,0 +1,95 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Server worker processes (exported by gunicorn.conf.py)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+# Seconds a member or group list is served before group_members is read again.
+# Joins on other workers never reach this cache, so lists are only kept when
+# there is one worker
+MEMBERSHIP_CACHE_TTL = int(os.getenv("MEMBERSHIP_CACHE_TTL", "30")) if WEB_CONCURRENCY == 1 else 0
+# Max number of user and of group lists kept per worker
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "20000"))
+
+
+class MembershipCache:
+    """Per-worker index of group_members: {group_id: role} per user and
+    {uid: role} per group.
+
+    Lists are loaded from Firestore on a miss and served for ``ttl`` seconds.
+    Memberships created on this worker are added to the cached lists as they
+    are written; ones created by other workers appear once the entry
+    expires, so staleness is bounded by the TTL. A load that overlapped a
+    local write is not stored, so it can never hide that write.
+    """
+
+    def __init__(self, max_size: int = MEMBERSHIP_CACHE_SIZE, ttl: int = MEMBERSHIP_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users: "OrderedDict[str, tuple[float, Dict[str, str]]]" = OrderedDict()
+        self._groups: "OrderedDict[str, tuple[float, Dict[str, str]]]" = OrderedDict()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def version(self) -> int:
+        """Token to pass to put_* for a load started now"""
+        return self._version
+
+    def _get(self, entries: OrderedDict, key: str) -> Optional[Dict[str, str]]:
+        entry = entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            entries.pop(key, None)
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def _put(self, entries: OrderedDict, key: str, roles: Dict[str, str], version: int) -> None:
+        if version != self._version or self.ttl <= 0:
+            return
+        entries[key] = (time.time() + self.ttl, dict(roles))
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def user_groups(self, uid: str) -> Optional[Dict[str, str]]:
+        """{group_id: role} for a user, or None if not cached"""
+        return self._get(self._users, uid)
+
+    def group_members(self, group_id: str) -> Optional[Dict[str, str]]:
+        """{uid: role} for a group, or None if not cached"""
+        return self._get(self._groups, group_id)
+
+    def put_user(self, uid: str, roles: Dict[str, str], version: int) -> None:
+        self._put(self._users, uid, roles, version)
+
+    def put_group(self, group_id: str, roles: Dict[str, str], version: int) -> None:
+        self._put(self._groups, group_id, roles, version)
+
+    def add(self, group_id: str, uid: str, role: str) -> None:
+        """Record a membership that was just written"""
+        self._version += 1
+        if uid in self._users:
+            self._users[uid][1][group_id] = role
+        if group_id in self._groups:
+            self._groups[group_id][1][uid] = role
+
+    def clear(self) -> None:
+        self._users.clear()
+        self._groups.clear()
+        self._version += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "users": len(self._users),
+            "groups": len(self._groups),
+            "max_size": self.max_size,
+        }
+
+
+membership_cache = MembershipCache()
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from enum import Enum
 from typing import List, Optional
 from datetime import datetime
@@ -22,13 +23,26 @@ HABIT_UNITS = {
     HabitType.STUDY: "hours"
 }
 
-# Helper functions
-def generate_join_code() -> str:
-    """Generate a random 6-character join code for groups"""
-    import random
-    import string
-    return "".join(random.choice(string.ascii_uppercase + string.digits) for _ in range(6))
+# habit_logs fields read for API responses (a Firestore field mask)
+HABIT_LOG_FIELDS = ["uid", "habitType", "value", "unit", "timestamp"]
+
+@dataclass(slots=True)
+class HabitLogRecord:
+    """A habit log as the API returns it: the HabitLogOut fields and nothing else"""
+    id: str
+    uid: str
+    habit_type: str
+    value: float
+    unit: Optional[str]
+    timestamp: datetime
 
+    @classmethod
+    def from_snapshot(cls, doc) -> "HabitLogRecord":
+        """Build from a habit_logs snapshot read with the HABIT_LOG_FIELDS mask"""
+        data = doc.to_dict()
+        return cls(doc.id, data["uid"], data["habitType"], data.get("value"), data.get("unit"), data["timestamp"])
+
+# Helper functions
 def get_default_unit(habit_type: HabitType) -> str:
     """Get default unit for a habit type"""
     return HABIT_UNITS.get(habit_type, "units")
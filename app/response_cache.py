@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.single_flight import SingleFlight, single_flight
+
+# Seconds a cached response may be served; 0 disables the cache
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))
+# Max number of cached responses per worker (in-process backend)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+# redis://host:port/db to share the cache between workers (needs `redis`)
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+# Server worker processes (exported by gunicorn.conf.py)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+
+logger = logging.getLogger(__name__)
+
+
+def user_scope(uid: str) -> str:
+    return f"user:{uid}"
+
+
+def group_scope(group_id: str) -> str:
+    return f"group:{group_id}"
+
+
+def cache_key(endpoint: str, scope: str, **params) -> str:
+    """Key for one endpoint's response, e.g. streak|user:abc|habit_type=water"""
+    return "|".join([endpoint, scope] + [f"{name}={params[name]}" for name in sorted(params)])
+
+
+class MemoryBackend:
+    """Per-worker LRU store. Invalidations only reach this worker's entries"""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._generations: "OrderedDict[str, tuple[int, float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def generations(self, scopes: List[str]) -> List[int]:
+        now = time.time()
+        result = []
+        for scope in scopes:
+            entry = self._generations.get(scope)
+            result.append(entry[0] if entry and entry[1] > now else 0)
+        return result
+
+    async def bump(self, scopes: List[str], ttl: int) -> None:
+        now = time.time()
+        for scope in scopes:
+            entry = self._generations.pop(scope, None)
+            generation = entry[0] if entry and entry[1] > now else 0
+            self._generations[scope] = (generation + 1, now + ttl)
+        # Bumps refresh the expiry, so the oldest generations are at the front
+        while self._generations:
+            scope, (_, expires_at) = next(iter(self._generations.items()))
+            if expires_at > now:
+                break
+            del self._generations[scope]
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared store so every worker sees the same entries and invalidations"""
+
+    def __init__(self, url: str, prefix: str = "wellness:cache:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError("RESPONSE_CACHE_URL needs the redis package: pip install redis") from e
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        await self._redis.set(self._prefix + key, json.dumps(value), ex=ttl)
+
+    async def generations(self, scopes: List[str]) -> List[int]:
+        if not scopes:
+            return []
+        values = await self._redis.mget([f"{self._prefix}gen:{scope}" for scope in scopes])
+        return [int(value) if value is not None else 0 for value in values]
+
+    async def bump(self, scopes: List[str], ttl: int) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for scope in scopes:
+                pipe.incr(f"{self._prefix}gen:{scope}")
+                pipe.expire(f"{self._prefix}gen:{scope}", ttl)
+            await pipe.execute()
+
+    async def clear(self) -> None:
+        async for key in self._redis.scan_iter(match=self._prefix + "*"):
+            await self._redis.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class ResponseCache:
+    """TTL cache for read endpoints, invalidated by generation counters.
+
+    Every entry records the generation of each scope it was built from
+    (user:{uid}, group:{group_id}); writes bump the scopes they touch, so
+    entries built before the write stop matching and are recomputed.
+    Generations live at least as long as any entry (the TTL), so an expired
+    counter can never make a stale entry look current. Values must be
+    JSON-compatible (model_dump(mode="json") or responses.jsonable) so
+    backends can be swapped.
+
+    Concurrent misses for a key share one compute() through ``flights``
+    when they saw the same scope generations. A request that starts after
+    a write sees the bumped generation and gets a computation of its own,
+    so coalescing never hides a caller's own write.
+    """
+
+    def __init__(self, backend, ttl: int = RESPONSE_CACHE_TTL, flights: SingleFlight = single_flight):
+        self.backend = backend
+        self.ttl = ttl
+        self.flights = flights
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    async def get_or_compute(
+        self,
+        key: str,
+        scopes: List[str],
+        compute: Callable[[], Awaitable[Any]],
+        dependencies: Optional[Callable[[Any], Iterable[str]]] = None,
+    ) -> Any:
+        """
+        Return the cached value for key, or await compute() and cache it.
+        dependencies(value) can name further scopes that are only known once
+        the value has been computed (e.g. the groups in a user's group list).
+        Without the cache (ttl 0 or backend errors) there are no generations
+        to tell writes apart, so those calls are not coalesced.
+        """
+        if self.ttl <= 0:
+            return await compute()
+
+        try:
+            entry = await self.backend.get(key)
+            if entry is not None:
+                deps = entry["deps"]
+                if await self.backend.generations(list(deps)) == list(deps.values()):
+                    self.hits += 1
+                    return entry["value"]
+            # Read before computing so a write that lands meanwhile invalidates the result
+            generations = await self.backend.generations(scopes)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Response cache unavailable: %s", e)
+            return await compute()
+
+        self.misses += 1
+        return await self.flights.do(
+            (key, *generations),
+            lambda: self._fill(key, scopes, generations, compute, dependencies),
+            kind=key.split("|", 1)[0]
+        )
+
+    async def _fill(self, key: str, scopes: List[str], generations: List[int],
+                    compute: Callable[[], Awaitable[Any]],
+                    dependencies: Optional[Callable[[Any], Iterable[str]]]) -> Any:
+        value = await compute()
+        deps = dict(zip(scopes, generations))
+        try:
+            extra = [scope for scope in (dependencies(value) if dependencies else []) if scope not in deps]
+            if extra:
+                deps.update(zip(extra, await self.backend.generations(extra)))
+            await self.backend.set(key, {"value": value, "deps": deps}, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Response cache unavailable: %s", e)
+        return value
+
+    async def invalidate(self, *scopes: str) -> None:
+        """Drop every cached response built from any of these scopes"""
+        if self.ttl <= 0 or not scopes:
+            return
+        try:
+            await self.backend.bump(list(scopes), self.ttl)
+            self.invalidations += 1
+        except Exception as e:
+            # Entries still expire after the TTL
+            self.errors += 1
+            logger.warning("Response cache invalidation failed: %s", e)
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "size": self.backend.size(),
+        }
+
+
+def _default_cache() -> ResponseCache:
+    if RESPONSE_CACHE_URL:
+        return ResponseCache(RedisBackend(RESPONSE_CACHE_URL))
+    if WEB_CONCURRENCY > 1:
+        # A write only invalidates its own worker's entries, so the others
+        # would keep serving stale responses
+        logger.warning("Response cache disabled: %d workers and no RESPONSE_CACHE_URL", WEB_CONCURRENCY)
+        return ResponseCache(MemoryBackend(), ttl=0)
+    return ResponseCache(MemoryBackend())
+
+
+response_cache = _default_cache()
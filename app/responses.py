@@ -0,0 +1,50 @@
+"""
+JSON rendering for API responses.
+
+ORJSONResponse is the app's default response class. It renders with orjson:
+dicts, lists, dataclass records (models.HabitLogRecord) and datetimes are
+written in C without a jsonable_encoder pass, and Pydantic models from
+schemas.py go straight through their compiled serializer. Handlers that
+already hold their final payload return ORJSONResponse(payload) themselves
+so FastAPI skips its own encoding, which also skips response_model
+validation: payloads that are not built as schema models go through
+validated() first.
+"""
+from datetime import datetime
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+def _default(value: Any) -> Any:
+    # orjson only takes exact datetimes; Firestore returns a subclass
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def validated(adapter: TypeAdapter, content: Any) -> Any:
+    """content checked against the adapter's schema (records are read by
+    attribute), as the plain data the schema allows; raises ValidationError"""
+    return adapter.dump_python(adapter.validate_python(content, from_attributes=True))
+
+
+def jsonable(content: Any) -> Any:
+    """Plain JSON types for content (e.g. to cache it), via one orjson round trip"""
+    return orjson.loads(dumps(content))
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return dumps(content)
@@ -1,15 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
 from typing import Dict, Any
-import sys
-import os
 
-# Add the parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from schemas import UserOut, MessageResponse
-from crud import create_or_update_user
-import firebase_admin
-from firebase_admin import auth
+from app.schemas import UserOut, MessageResponse
+from app.crud import create_or_update_user
+from app.database import firebase_app
+from app.token_cache import token_cache
+from app.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 
 router = APIRouter()
 
@@ -24,9 +21,18 @@ async def get_current_user(authorization: str = Header(None)) -> Dict[str, Any]:
     # Extract token
     token = authorization.split(" ", 1)[1]
     
+    # Repeat calls with the same token skip signature verification
+    decoded_token = token_cache.get(token)
+    if decoded_token is not None:
+        return decoded_token
+    
     try:
-        # Verify Firebase ID token
-        decoded_token = auth.verify_id_token(token)
+        # firebase_admin is only loaded once a token actually needs verifying
+        from firebase_admin import auth
+        
+        # Verify Firebase ID token (blocking crypto, keep it off the event loop)
+        decoded_token = await run_in_threadpool(auth.verify_id_token, token, firebase_app())
+        token_cache.put(token, decoded_token)
         return decoded_token
     except Exception as e:
         raise HTTPException(
@@ -46,10 +52,10 @@ async def verify_user(current_user: Dict[str, Any] = Depends(get_current_user)):
             photo_url=current_user.get("picture")
         )
         
-        return MessageResponse(
+        return ORJSONResponse(MessageResponse(
             message="User verified successfully",
             success=True
-        )
+        ))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -59,9 +65,9 @@ async def verify_user(current_user: Dict[str, Any] = Depends(get_current_user)):
 @router.get("/me", response_model=UserOut)
 async def get_current_user_info(current_user: Dict[str, Any] = Depends(get_current_user)):
     """Get current user information"""
-    return UserOut(
+    return ORJSONResponse(UserOut(
         uid=current_user["uid"],
         email=current_user.get("email"),
         displayName=current_user.get("name"),
         photoUrl=current_user.get("picture")
-    )
+    ))
@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List
-import sys
-import os
 
-# Add the parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pydantic import TypeAdapter
 
-from schemas import GroupCreate, GroupJoin, GroupOut, MessageResponse
-from crud import create_group, join_group
-from routers.auth import get_current_user
+from app.schemas import GroupCreate, GroupJoin, GroupOut, MessageResponse, LeaderboardOut, MyGroupsOut
+from app.crud import create_group, join_group, get_user_groups, get_group_leaderboard, leaderboard_window_start
+from app.crud import is_group_member
+from app.utils import rank_leaderboard
+from app.routers.auth import get_current_user
+from app.response_cache import response_cache, cache_key, user_scope, group_scope
+from app.responses import ORJSONResponse, jsonable, validated
 
 router = APIRouter()
 
+# Leaderboard pages are rendered directly, so they are validated against this
+leaderboard_adapter = TypeAdapter(LeaderboardOut)
+
 @router.post("/create", response_model=GroupOut)
 async def create_wellness_group(
     group_data: GroupCreate,
@@ -24,14 +28,14 @@ async def create_wellness_group(
             owner_id=current_user["uid"]
         )
         
-        return GroupOut(
+        return ORJSONResponse(GroupOut(
             id=group["id"],
             name=group["name"],
             join_code=group["joinCode"],
             owner_id=group["ownerId"],
             created_at=group.get("createdAt"),
             member_count=1
-        )
+        ))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -56,10 +60,10 @@ async def join_wellness_group(
                 detail="Group not found with this join code"
             )
         
-        return MessageResponse(
+        return ORJSONResponse(MessageResponse(
             message=f"Successfully joined group: {group['name']}",
             success=True
-        )
+        ))
     except HTTPException:
         raise
     except Exception as e:
@@ -68,118 +72,80 @@ async def join_wellness_group(
             detail=f"Failed to join group: {str(e)}"
         )
 
-@router.get("/my-groups")
+@router.get("/my-groups", response_model=MyGroupsOut)
 async def get_my_groups(
     current_user = Depends(get_current_user)
 ):
     """Get all groups the user is a member of"""
-    try:
-        from database import get_db
-        db = get_db()
-        
-        # Get user's group memberships
-        memberships = db.collection("group_members").where("userId", "==", current_user["uid"]).stream()
-        
-        groups = []
-        for membership in memberships:
-            member_data = membership.to_dict()
-            group_id = member_data["groupId"]
-            
-            # Get group details
-            group_doc = db.collection("groups").document(group_id).get()
-            if group_doc.exists:
-                group_data = group_doc.to_dict()
-                group_data["id"] = group_id
-                
-                # Count members
-                member_count = len(list(db.collection("group_members").where("groupId", "==", group_id).stream()))
-                group_data["member_count"] = member_count
-                group_data["my_role"] = member_data["role"]
-                
-                groups.append(group_data)
+    uid = current_user["uid"]
+    
+    async def compute():
+        groups = await get_user_groups(uid)
         
-        return {
-            "groups": groups,
-            "total_count": len(groups)
-        }
+        return jsonable(MyGroupsOut(groups=groups, total_count=len(groups)).model_dump())
+    
+    try:
+        # Member counts change when others join, so also depend on each group
+        return ORJSONResponse(await response_cache.get_or_compute(
+            cache_key("my-groups", user_scope(uid)),
+            [user_scope(uid)],
+            compute,
+            dependencies=lambda value: [group_scope(group["id"]) for group in value["groups"]]
+        ))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get groups: {str(e)}"
         )
 
-@router.get("/{group_id}/leaderboard")
-async def get_group_leaderboard(
+@router.get("/{group_id}/leaderboard", response_model=LeaderboardOut)
+async def get_leaderboard(
     group_id: str,
+    offset: int = Query(0, ge=0, description="Number of ranked members to skip"),
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
     current_user = Depends(get_current_user)
 ):
     """Get leaderboard for a specific group"""
-    try:
-        from database import get_db
-        from datetime import datetime, timedelta
-        db = get_db()
-        
-        # Check if user is member of this group
-        membership = db.collection("group_members").document(f"{group_id}_{current_user['uid']}").get()
-        if not membership.exists:
-            raise HTTPException(
-                status_code=403,
-                detail="You are not a member of this group"
-            )
-        
-        # Get group info
-        group_doc = db.collection("groups").document(group_id).get()
-        if not group_doc.exists:
+    async def compute():
+        board = await get_group_leaderboard(group_id)
+        if board is None:
             raise HTTPException(
                 status_code=404,
                 detail="Group not found"
             )
         
-        group_data = group_doc.to_dict()
-        
-        # Get all group members
-        members = db.collection("group_members").where("groupId", "==", group_id).stream()
-        
-        leaderboard = []
-        week_start = datetime.utcnow() - timedelta(days=7)
-        
-        for member in members:
-            member_data = member.to_dict()
-            user_id = member_data["userId"]
-            
-            # Get user info
-            user_doc = db.collection("users").document(user_id).get()
-            user_info = user_doc.to_dict() if user_doc.exists else {}
-            
-            # Calculate consistency score (logs in last 7 days)
-            logs_count = len(list(
-                db.collection("habit_logs")
-                .where("uid", "==", user_id)
-                .where("timestamp", ">=", week_start)
-                .stream()
-            ))
-            
-            # Simple consistency score: logs per day (max 7 days = 100%)
-            consistency_score = min(100, (logs_count / 7) * 100)
-            
-            leaderboard.append({
-                "user_id": user_id,
-                "display_name": user_info.get("displayName", "Anonymous"),
-                "role": member_data["role"],
-                "consistency_score": round(consistency_score, 1),
-                "weekly_logs": logs_count
-            })
+        week_start = leaderboard_window_start()
+        return jsonable({
+            "group_name": board["groupName"],
+            "leaderboard": rank_leaderboard(board["members"], week_start.date()),
+            "week_start": week_start
+        })
+    
+    try:
+        # Authorize first, so non-members can't tell which group ids exist
+        if not await is_group_member(group_id, current_user["uid"]):
+            raise HTTPException(
+                status_code=403,
+                detail="You are not a member of this group"
+            )
         
-        # Sort by consistency score
-        leaderboard.sort(key=lambda x: x["consistency_score"], reverse=True)
+        # One entry per group serves every member and every page
+        ranked = await response_cache.get_or_compute(
+            cache_key("leaderboard", group_scope(group_id)),
+            [group_scope(group_id)],
+            compute
+        )
+        leaderboard = ranked["leaderboard"]
         
-        return {
+        return ORJSONResponse(validated(leaderboard_adapter, {
             "group_id": group_id,
-            "group_name": group_data["name"],
-            "leaderboard": leaderboard,
-            "week_start": week_start,
-            "total_members": len(leaderboard)
-        }
+            "group_name": ranked["group_name"],
+            "leaderboard": leaderboard[offset:offset + limit],
+            "week_start": ranked["week_start"],
+            "total_members": len(leaderboard),
+            "offset": offset,
+            "limit": limit
+        }))
     except HTTPException:
         raise
     except Exception as e:
@@ -1,19 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
-import sys
-import os
 
-# Add the parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from schemas import HabitLogIn, HabitLogOut, StreakOut, MessageResponse
-from crud import add_habit_log, get_habit_logs, get_streak
-from models import HabitType
-from routers.auth import get_current_user
+from pydantic import TypeAdapter, ValidationError
+from app.schemas import HabitLogIn, HabitLogOut, HabitLogsPage, HabitSummaryOut, StreakOut, MessageResponse
+from app.schemas import HabitLogBatchIn, HabitLogBatchItem, HabitLogBatchResult, HabitLogBatchOut
+from app.crud import add_habit_log, add_habit_logs, get_habit_logs, get_habit_logs_page, stream_habit_logs
+from app.crud import get_streak, summarize_habits
+from app.models import HabitType
+from app.routers.auth import get_current_user
+from app.response_cache import response_cache, cache_key, user_scope
+from app.responses import ORJSONResponse, dumps, jsonable, validated
 
 router = APIRouter()
 
+# Page size of /habits/logs when a cursor is passed without one
+DEFAULT_LOGS_PAGE_SIZE = 100
+
+# Responses rendered directly are validated against these
+logs_page_adapter = TypeAdapter(HabitLogsPage)
+log_adapter = TypeAdapter(HabitLogOut)
+
 @router.post("/log", response_model=MessageResponse)
 async def log_habit(
     habit_data: HabitLogIn,
@@ -29,41 +37,121 @@ async def log_habit(
             timestamp=habit_data.timestamp
         )
         
-        return MessageResponse(
+        return ORJSONResponse(MessageResponse(
             message=f"Habit logged successfully with ID: {log_id}",
             success=True
-        )
+        ))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to log habit: {str(e)}"
         )
 
-@router.get("/logs")
+@router.post("/log/batch", response_model=HabitLogBatchOut)
+async def log_habits_batch(
+    batch: HabitLogBatchIn,
+    current_user = Depends(get_current_user)
+):
+    """Log many habit entries (e.g. an offline backlog) in one request"""
+    results = [None] * len(batch.entries)
+    valid = []
+    for index, entry in enumerate(batch.entries):
+        try:
+            item = HabitLogBatchItem.model_validate(entry)
+            valid.append((index, item))
+        except ValidationError as e:
+            # Errors about the entry as a whole (e.g. not an object) have no location
+            error = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" if err["loc"] else err["msg"]
+                for err in e.errors()
+            )
+            client_id = entry.get("client_id") if isinstance(entry, dict) else None
+            results[index] = HabitLogBatchResult(
+                index=index,
+                client_id=client_id if isinstance(client_id, str) else None,
+                status="invalid",
+                error=error
+            )
+    
+    try:
+        written = await add_habit_logs(
+            uid=current_user["uid"],
+            entries=[item.model_dump() for _, item in valid]
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to log habits: {str(e)}"
+        )
+    
+    for (index, item), result in zip(valid, written):
+        results[index] = HabitLogBatchResult(index=index, client_id=item.client_id, **result)
+    
+    return ORJSONResponse(HabitLogBatchOut(
+        results=results,
+        created=sum(result.status == "created" for result in results),
+        duplicates=sum(result.status == "duplicate" for result in results),
+        failed=sum(result.status in ("invalid", "failed") for result in results)
+    ))
+
+@router.get("/logs", response_model=HabitLogsPage)
 async def get_habits(
     habit_type: Optional[HabitType] = Query(None, description="Filter by habit type"),
     days: int = Query(7, ge=1, le=365, description="Number of days to retrieve"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Logs per page (default 100 when paging)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams every log in the window"),
     current_user = Depends(get_current_user)
 ):
-    """Get habit logs for the current user"""
+    """
+    Get habit logs for the current user. Without page_size or cursor every log
+    in the window is returned, as before pagination existed; with either, one
+    page is returned along with the cursor of the next.
+    """
+    if format == "ndjson":
+        if page_size is not None or cursor is not None:
+            raise HTTPException(
+                status_code=400,
+                detail="page_size and cursor apply to format=json; ndjson streams the whole window"
+            )
+        
+        async def lines():
+            async for log in stream_habit_logs(uid=current_user["uid"], habit_type=habit_type, days=days):
+                yield dumps(validated(log_adapter, log)) + b"\n"
+        
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
     try:
-        logs = await get_habit_logs(
-            uid=current_user["uid"],
-            habit_type=habit_type,
-            days=days
+        if page_size is None and cursor is None:
+            logs = await get_habit_logs(uid=current_user["uid"], habit_type=habit_type, days=days)
+            next_cursor = None
+        else:
+            logs, next_cursor = await get_habit_logs_page(
+                uid=current_user["uid"],
+                habit_type=habit_type,
+                days=days,
+                page_size=page_size or DEFAULT_LOGS_PAGE_SIZE,
+                cursor=cursor
+            )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
         )
-        
-        return {
-            "logs": logs,
-            "total_count": len(logs),
-            "days_requested": days,
-            "habit_type": habit_type.value if habit_type else "all"
-        }
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to retrieve habits: {str(e)}"
         )
+    
+    # Outside the try: a payload that fails validation is a server error, not a bad cursor
+    return ORJSONResponse(validated(logs_page_adapter, {
+        "logs": logs,
+        "total_count": len(logs),
+        "days_requested": days,
+        "habit_type": habit_type.value if habit_type else "all",
+        "next_cursor": next_cursor
+    }))
 
 @router.get("/streak/{habit_type}", response_model=StreakOut)
 async def get_habit_streak(
@@ -71,9 +159,11 @@ async def get_habit_streak(
     current_user = Depends(get_current_user)
 ):
     """Get streak information for a specific habit"""
-    try:
+    uid = current_user["uid"]
+    
+    async def compute():
         streak_data = await get_streak(
-            uid=current_user["uid"],
+            uid=uid,
             habit_type=habit_type
         )
         
@@ -82,47 +172,47 @@ async def get_habit_streak(
             current_streak=streak_data["current_streak"],
             best_streak=streak_data["best_streak"],
             updated_at=streak_data["updated_at"]
-        )
+        ).model_dump(mode="json")
+    
+    try:
+        # Cached values were validated and encoded when computed
+        return ORJSONResponse(await response_cache.get_or_compute(
+            cache_key("streak", user_scope(uid), habit_type=habit_type.value),
+            [user_scope(uid)],
+            compute
+        ))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get streak: {str(e)}"
         )
 
-@router.get("/summary")
+@router.get("/summary", response_model=HabitSummaryOut)
 async def get_habits_summary(
     days: int = Query(7, ge=1, le=30, description="Number of days for summary"),
     current_user = Depends(get_current_user)
 ):
     """Get a summary of all habits for the user"""
-    try:
-        summary = {}
-        
-        # Get data for each habit type
-        for habit_type in HabitType:
-            logs = await get_habit_logs(
-                uid=current_user["uid"],
-                habit_type=habit_type,
-                days=days
-            )
-            
-            streak_data = await get_streak(
-                uid=current_user["uid"],
-                habit_type=habit_type
-            )
-            
-            summary[habit_type.value] = {
-                "total_entries": len(logs),
-                "current_streak": streak_data["current_streak"],
-                "best_streak": streak_data["best_streak"],
-                "recent_logs": logs[:5]  # Last 5 entries
-            }
+    uid = current_user["uid"]
+    
+    async def compute():
+        summary = await summarize_habits(
+            uid=uid,
+            days=days
+        )
         
-        return {
+        return jsonable(HabitSummaryOut.model_validate({
             "summary": summary,
             "days_covered": days,
-            "user_id": current_user["uid"]
-        }
+            "user_id": uid
+        }, from_attributes=True).model_dump())
+    
+    try:
+        return ORJSONResponse(await response_cache.get_or_compute(
+            cache_key("summary", user_scope(uid), days=days),
+            [user_scope(uid)],
+            compute
+        ))
     except Exception as e:
         raise HTTPException(
             status_code=500,
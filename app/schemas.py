@@ -1,10 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, Optional, List
 from datetime import datetime
-try:
-    from app.models import HabitType, GroupRole
-except ImportError:
-    from models import HabitType, GroupRole
+from app.models import HabitType, GroupRole
 
 
 # User schemas
@@ -22,7 +19,32 @@ class HabitLogIn(BaseModel):
     unit: Optional[str] = None
     timestamp: Optional[datetime] = None
 
+class HabitLogBatchItem(HabitLogIn):
+    client_id: str = Field(min_length=1, max_length=128, pattern=r"^[A-Za-z0-9_-]+$",
+                           description="Client-generated id; resending the same id is a no-op")
+
+class HabitLogBatchIn(BaseModel):
+    # Entries are validated one by one (as HabitLogBatchItem) so a bad entry,
+    # even one that isn't an object, doesn't reject the batch
+    entries: List[Any] = Field(min_length=1, max_length=1000)
+
+class HabitLogBatchResult(BaseModel):
+    index: int
+    client_id: Optional[str] = None
+    id: Optional[str] = None
+    status: str  # created | duplicate | invalid | failed
+    error: Optional[str] = None
+
+class HabitLogBatchOut(BaseModel):
+    results: List[HabitLogBatchResult]
+    created: int
+    duplicates: int
+    failed: int
+
 class HabitLogOut(BaseModel):
+    # Also validates from HabitLogRecord objects
+    model_config = ConfigDict(from_attributes=True)
+    
     id: str
     uid: str
     habit_type: HabitType
@@ -30,6 +52,24 @@ class HabitLogOut(BaseModel):
     unit: str
     timestamp: datetime
 
+class HabitLogsPage(BaseModel):
+    logs: List[HabitLogOut]
+    total_count: int
+    days_requested: int
+    habit_type: str
+    next_cursor: Optional[str] = None
+
+class HabitSummary(BaseModel):
+    total_entries: int
+    recent_logs: List[HabitLogOut]
+    current_streak: int
+    best_streak: int
+
+class HabitSummaryOut(BaseModel):
+    summary: Dict[str, HabitSummary]
+    days_covered: int
+    user_id: str
+
 class StreakOut(BaseModel):
     habit_type: HabitType
     current_streak: int
@@ -56,6 +96,8 @@ class GroupMember(BaseModel):
     display_name: Optional[str] = None
     role: GroupRole
     consistency_score: Optional[float] = None
+    # Logs over the 7 UTC calendar days ending today
+    weekly_logs: int = 0
 
 class GroupLeaderboard(BaseModel):
     group_id: str
@@ -63,6 +105,21 @@ class GroupLeaderboard(BaseModel):
     members: List[GroupMember]
     week_start: datetime
 
+class LeaderboardOut(BaseModel):
+    group_id: str
+    group_name: str
+    leaderboard: List[GroupMember]
+    # Midnight UTC six days before today: the window is 7 whole calendar days
+    week_start: datetime
+    total_members: int
+    offset: int
+    limit: int
+
+class MyGroupsOut(BaseModel):
+    # Group docs as stored, plus member_count and my_role
+    groups: List[Dict[str, Any]]
+    total_count: int
+
 # Response schemas
 class MessageResponse(BaseModel):
     message: str
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Share one computation between concurrent identical reads ("0" disables)
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one computation.
+
+    The first caller for a key runs fn() itself; callers arriving while it
+    runs wait for its result (or its exception) instead of running their
+    own. Waiters are shielded, so one that is cancelled doesn't cancel the
+    shared result; if the computing caller is cancelled, the waiters start
+    over. Keys are per worker, and the next call after the computation
+    finishes starts a new one.
+    """
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.coalesced_by_kind: Counter = Counter()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], kind: str = "") -> Any:
+        """Result of fn(), shared with any concurrent call for the same key"""
+        if not self.enabled:
+            return await fn()
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            self.coalesced_by_kind[kind] += 1
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            logger.debug("Single-flight computation for %r was cancelled, retrying", key)
+            return await self.do(key, fn, kind)
+
+        # Run inline rather than in a task: an uncontended call costs no extra
+        # trips through the event loop
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        self.executions += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            # Retrieved here so it isn't reported as unhandled when nobody waited
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_by_kind": dict(self.coalesced_by_kind),
+        }
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,2 @@
+# Storage backends: the document-store interface crud.py is written against
+# (base.py) and a local in-memory engine that implements it (memory.py)
@@ -0,0 +1,65 @@
+"""
+The document-store interface the data layer depends on.
+
+It is the subset of google.cloud.firestore.AsyncClient that crud.py uses, so
+the Firestore client satisfies it as-is and local engines (see memory.py)
+implement the same calls. Values may contain the google.cloud.firestore
+sentinels (SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion, ...) and
+keys passed to update() / merge=[...] are dotted field paths.
+"""
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Protocol
+
+
+class DocumentSnapshot(Protocol):
+    id: str
+    exists: bool
+    reference: "DocumentReference"
+
+    def to_dict(self) -> Optional[Dict[str, Any]]: ...
+    def get(self, field_path: str) -> Any: ...
+
+
+class Query(Protocol):
+    def where(self, field_path: str, op_string: str, value: Any) -> "Query": ...
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "Query": ...
+    def limit(self, count: int) -> "Query": ...
+    def select(self, field_paths: Iterable[str]) -> "Query": ...
+    def start_after(self, document_fields: Any) -> "Query": ...
+    def count(self) -> Any: ...
+    def stream(self, transaction: Any = None) -> AsyncIterator[DocumentSnapshot]: ...
+    async def get(self, transaction: Any = None) -> List[DocumentSnapshot]: ...
+
+
+class DocumentReference(Protocol):
+    id: str
+    parent: "CollectionReference"
+
+    async def get(self, transaction: Any = None) -> DocumentSnapshot: ...
+    async def set(self, document_data: Dict[str, Any], merge: Any = False) -> Any: ...
+    async def update(self, field_updates: Dict[str, Any]) -> Any: ...
+    async def create(self, document_data: Dict[str, Any]) -> Any: ...
+    async def delete(self) -> Any: ...
+
+
+class CollectionReference(Query, Protocol):
+    id: str
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference: ...
+
+
+class WriteBatch(Protocol):
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: Any = False) -> None: ...
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any]) -> None: ...
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> None: ...
+    def delete(self, reference: DocumentReference) -> None: ...
+    async def commit(self) -> Any: ...
+
+
+class DocumentStore(Protocol):
+    def collection(self, collection_id: str) -> CollectionReference: ...
+    def batch(self) -> WriteBatch: ...
+    def transaction(self) -> Any: ...
+    def get_all(self, references: List[DocumentReference], transaction: Any = None) -> AsyncIterator[DocumentSnapshot]: ...
+
+    @staticmethod
+    def field_path(*field_names: str) -> str: ...
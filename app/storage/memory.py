@@ -0,0 +1,621 @@
+"""
+In-memory implementation of the document-store interface (see base.py).
+
+Good enough to run the whole API offline for development, benchmarks and
+load tests: it supports the queries, transforms, batches, transactions and
+aggregations crud.py uses, with sorted secondary indexes so the hot
+habit_logs lookups on (uid, habitType, timestamp) don't scan the collection.
+Data lives in the worker process and is lost on restart.
+"""
+import asyncio
+import bisect
+import random
+import string
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Equality fields (and optional sort field) indexed per collection
+DEFAULT_INDEXES = {
+    "habit_logs": [(("uid",), "timestamp"), (("uid", "habitType"), "timestamp")],
+    "group_members": [(("groupId",), None), (("userId",), None)],
+    "groups": [(("joinCode",), None)],
+    "daily_rollups": [(("uid",), "day")],
+}
+
+_MAX_ID = chr(0x10FFFF)
+
+
+def _auto_id() -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits, k=20))
+
+
+def _split_path(field_path: str) -> Tuple[str, ...]:
+    return tuple(FieldPath.from_string(field_path).parts)
+
+
+def _copy(value):
+    """Copy nested maps/arrays so callers never share state with the store"""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _normalize(value):
+    """Store timestamps the way Firestore returns them: timezone-aware UTC"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _order_key(value) -> Tuple[int, Any]:
+    """Firestore's cross-type ordering: null < bool < number < timestamp < string < ref < array < map"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, _normalize(value))
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, MemoryDocumentReference):
+        return (5, value.path)
+    if isinstance(value, list):
+        return (6, tuple(_order_key(item) for item in value))
+    return (7, repr(value))
+
+
+_MISSING = object()
+
+
+def _get_path(data: Dict[str, Any], parts: Tuple[str, ...]):
+    for part in parts:
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+def _apply_value(target: Dict[str, Any], key: str, value, now: datetime) -> None:
+    """Write one (possibly sentinel) value into target[key]"""
+    current = target.get(key)
+    if value is transforms.DELETE_FIELD:
+        target.pop(key, None)
+    elif value is transforms.SERVER_TIMESTAMP:
+        target[key] = now
+    elif isinstance(value, transforms.Increment):
+        target[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+    elif isinstance(value, transforms.Maximum):
+        target[key] = value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    elif isinstance(value, transforms.Minimum):
+        target[key] = value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    elif isinstance(value, transforms.ArrayUnion):
+        items = list(current) if isinstance(current, list) else []
+        items += [item for item in _normalize(list(value.values)) if item not in items]
+        target[key] = items
+    elif isinstance(value, transforms.ArrayRemove):
+        removed = _normalize(list(value.values))
+        target[key] = [item for item in (current if isinstance(current, list) else []) if item not in removed]
+    elif isinstance(value, dict):
+        target[key] = {}
+        for child_key, child in value.items():
+            _apply_value(target[key], child_key, child, now)
+    else:
+        target[key] = _normalize(_copy(value))
+
+
+def _set_path(data: Dict[str, Any], parts: Tuple[str, ...], value, now: datetime) -> None:
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    _apply_value(data, parts[-1], value, now)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any], now: datetime) -> None:
+    """set(merge=True): nested maps are merged field by field"""
+    for key, value in data.items():
+        if isinstance(value, dict) and value and isinstance(target.get(key), dict):
+            _merge(target[key], value, now)
+        else:
+            _apply_value(target, key, value, now)
+
+
+def _matches(value, op: str, operand) -> bool:
+    if value is _MISSING:
+        # Documents without the field never match a filter on it
+        return False
+    if op == "==":
+        return _order_key(value) == _order_key(operand)
+    if op == "!=":
+        return _order_key(value) != _order_key(operand)
+    if op == "in":
+        return any(_order_key(value) == _order_key(item) for item in operand)
+    if op == "not-in":
+        return all(_order_key(value) != _order_key(item) for item in operand)
+    if op == "array_contains":
+        return isinstance(value, list) and any(_order_key(item) == _order_key(operand) for item in value)
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(
+            _order_key(item) == _order_key(candidate) for item in value for candidate in operand
+        )
+
+    left, right = _order_key(value), _order_key(operand)
+    if left[0] != right[0]:
+        # Range filters only match values of the same type
+        return False
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+class _Index:
+    """Equality index on some fields, optionally kept sorted by one more field"""
+
+    def __init__(self, fields: Tuple[str, ...], sort_field: Optional[str]):
+        self.fields = fields
+        self.sort_field = sort_field
+        self.sorted: Dict[tuple, List[Tuple[Tuple[int, Any], str]]] = {}
+        self.unsorted: Dict[tuple, set] = {}
+
+    def _key(self, data: Dict[str, Any]) -> Optional[tuple]:
+        values = [data.get(field, _MISSING) for field in self.fields]
+        if any(value is _MISSING for value in values):
+            return None
+        return tuple(_order_key(value) for value in values)
+
+    def add(self, doc_id: str, data: Dict[str, Any]) -> None:
+        key = self._key(data)
+        if key is None:
+            return
+        if self.sort_field and self.sort_field in data:
+            bisect.insort(self.sorted.setdefault(key, []), (_order_key(data[self.sort_field]), doc_id))
+        else:
+            self.unsorted.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: str, data: Dict[str, Any]) -> None:
+        key = self._key(data)
+        if key is None:
+            return
+        if self.sort_field and self.sort_field in data:
+            entries = self.sorted.get(key, [])
+            position = bisect.bisect_left(entries, (_order_key(data[self.sort_field]), doc_id))
+            if position < len(entries) and entries[position][1] == doc_id:
+                entries.pop(position)
+        else:
+            self.unsorted.get(key, set()).discard(doc_id)
+
+    def lookup(self, equals: Dict[str, Any], ranges: List[Tuple[str, Any]]) -> List[str]:
+        key = tuple(_order_key(equals[field]) for field in self.fields)
+        entries = self.sorted.get(key, [])
+        low, high = 0, len(entries)
+        for op, operand in ranges:
+            bound = _order_key(operand)
+            if op == ">=":
+                low = max(low, bisect.bisect_left(entries, (bound, "")))
+            elif op == ">":
+                low = max(low, bisect.bisect_right(entries, (bound, _MAX_ID)))
+            elif op == "<":
+                high = min(high, bisect.bisect_left(entries, (bound, "")))
+            elif op == "<=":
+                high = min(high, bisect.bisect_right(entries, (bound, _MAX_ID)))
+        ids = [doc_id for _, doc_id in entries[low:high]]
+        if not ranges:
+            # Docs without the sort field still match pure equality lookups
+            ids += list(self.unsorted.get(key, ()))
+        return ids
+
+
+class MemorySnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[Dict[str, Any]], update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+        self.update_time = update_time
+        self.read_time = datetime.now(timezone.utc)
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        if self._data is None:
+            return None
+        value = _get_path(self._data, _split_path(field_path))
+        if value is _MISSING:
+            raise KeyError(f"'{field_path}' is not contained in the data")
+        return _copy(value)
+
+
+class MemoryQuery:
+    def __init__(self, client: "MemoryClient", collection_id: str, filters=(), orders=(),
+                 limit_count=None, projection=None, cursor=None):
+        self._client = client
+        self._collection_id = collection_id
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._projection = projection
+        self._cursor = cursor
+
+    def _copy_with(self, **changes) -> "MemoryQuery":
+        params = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit_count": self._limit,
+            "projection": self._projection,
+            "cursor": self._cursor,
+        }
+        params.update(changes)
+        return MemoryQuery(self._client, self._collection_id, **params)
+
+    def where(self, field_path: str, op_string: str, value) -> "MemoryQuery":
+        return self._copy_with(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        return self._copy_with(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy_with(limit_count=count)
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy_with(projection=[_split_path(path) for path in field_paths])
+
+    def start_after(self, document_fields) -> "MemoryQuery":
+        if isinstance(document_fields, MemorySnapshot):
+            fields = document_fields.to_dict()
+            fields["__name__"] = document_fields.id
+            document_fields = fields
+        return self._copy_with(cursor=document_fields)
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self, alias or "field_1")
+
+    def _order_values(self, doc_id: str, data: Dict[str, Any], orders) -> Optional[list]:
+        values = []
+        for field_path, _ in orders:
+            if field_path == "__name__":
+                values.append(_order_key(doc_id))
+                continue
+            value = _get_path(data, _split_path(field_path))
+            if value is _MISSING:
+                return None
+            values.append(_order_key(value))
+        return values
+
+    def _run(self) -> List[Tuple[str, Dict[str, Any]]]:
+        store = self._client._collection(self._collection_id)
+        doc_ids = self._client._plan(self._collection_id, self._filters)
+
+        results = []
+        for doc_id in doc_ids:
+            data = store.get(doc_id)
+            if data is None:
+                continue
+            if all(
+                _matches(doc_id if field == "__name__" else _get_path(data, _split_path(field)), op, value)
+                for field, op, value in self._filters
+            ):
+                results.append((doc_id, data))
+
+        # Firestore orders by the inequality field first and by __name__ last
+        orders = list(self._orders)
+        range_fields = [field for field, op, _ in self._filters if op in ("<", "<=", ">", ">=", "!=", "not-in")]
+        if range_fields and range_fields[0] not in [field for field, _ in orders]:
+            orders.insert(0, (range_fields[0], "ASCENDING"))
+        if "__name__" not in [field for field, _ in orders]:
+            orders.append(("__name__", orders[-1][1] if orders else "ASCENDING"))
+
+        keyed = []
+        for doc_id, data in results:
+            values = self._order_values(doc_id, data, orders)
+            if values is not None:
+                keyed.append((values, doc_id, data))
+        for position in reversed(range(len(orders))):
+            descending = orders[position][1] == "DESCENDING"
+            keyed.sort(key=lambda item: item[0][position], reverse=descending)
+
+        if self._cursor is not None:
+            cursor = [
+                _order_key(value.id if isinstance(value, MemoryDocumentReference) else value)
+                for value in self._cursor_values(orders)
+            ]
+            keyed = [item for item in keyed if self._is_after(item[0], cursor, orders)]
+
+        if self._limit is not None:
+            keyed = keyed[:self._limit]
+        return [(doc_id, data) for _, doc_id, data in keyed]
+
+    def _cursor_values(self, orders) -> list:
+        if isinstance(self._cursor, dict):
+            values = []
+            for field_path, _ in orders:
+                if field_path not in self._cursor:
+                    break
+                values.append(self._cursor[field_path])
+            return values
+        return list(self._cursor)
+
+    @staticmethod
+    def _is_after(values, cursor, orders) -> bool:
+        for value, bound, (_, direction) in zip(values, cursor, orders):
+            if value == bound:
+                continue
+            return value < bound if direction == "DESCENDING" else value > bound
+        return False
+
+    def _snapshot(self, doc_id: str, data: Dict[str, Any]) -> MemorySnapshot:
+        if self._projection is not None:
+            projected = {}
+            now = self._client._now()
+            for parts in self._projection:
+                value = _get_path(data, parts)
+                if value is not _MISSING:
+                    _set_path(projected, parts, value, now)
+            data = projected
+        reference = self._client.collection(self._collection_id).document(doc_id)
+        return MemorySnapshot(reference, data)
+
+    async def stream(self, transaction=None):
+        rows = self._run()
+        self._client._count(reads=max(1, len(rows)))
+        for doc_id, data in rows:
+            yield self._snapshot(doc_id, data)
+
+    async def get(self, transaction=None) -> List[MemorySnapshot]:
+        rows = self._run()
+        self._client._count(reads=max(1, len(rows)))
+        return [self._snapshot(doc_id, data) for doc_id, data in rows]
+
+
+class MemoryAggregationQuery:
+    def __init__(self, query: MemoryQuery, alias: str):
+        self._query = query
+        self._alias = alias
+
+    async def get(self, transaction=None) -> List[List[AggregationResult]]:
+        count = len(self._query._run())
+        # Billed like Firestore: one read per batch of up to 1000 index entries
+        self._query._client._count(reads=max(1, -(-count // 1000)))
+        return [[AggregationResult(alias=self._alias, value=count, read_time=datetime.now(timezone.utc))]]
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryClient", collection_id: str):
+        super().__init__(client, collection_id)
+        self.id = collection_id
+
+    def document(self, document_id: Optional[str] = None) -> "MemoryDocumentReference":
+        return MemoryDocumentReference(self._client, self, document_id or _auto_id())
+
+    async def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        reference = self.document(document_id)
+        await reference.create(document_data)
+        return self._client._now(), reference
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", parent: MemoryCollectionReference, document_id: str):
+        self._client = client
+        self.parent = parent
+        self.id = document_id
+        self.path = f"{parent.id}/{document_id}"
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    async def get(self, transaction=None) -> MemorySnapshot:
+        self._client._count(reads=1)
+        return self._client._snapshot(self)
+
+    async def set(self, document_data: Dict[str, Any], merge=False):
+        self._client._write([("set", self, document_data, merge)])
+
+    async def update(self, field_updates: Dict[str, Any]):
+        self._client._write([("update", self, field_updates, None)])
+
+    async def create(self, document_data: Dict[str, Any]):
+        self._client._write([("create", self, document_data, None)])
+
+    async def delete(self):
+        self._client._write([("delete", self, None, None)])
+
+
+class MemoryWriteBatch:
+    """Buffered writes applied atomically on commit (also used by transactions)"""
+
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append(("update", reference, field_updates, None))
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, None))
+
+    def delete(self, reference):
+        self._writes.append(("delete", reference, None, None))
+
+    async def commit(self):
+        writes, self._writes = self._writes, []
+        self._client._write(writes)
+        return writes
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Reads go through the client with transaction=...; writes commit together"""
+
+
+class MemoryClient:
+    """Local document store implementing the subset of AsyncClient used by crud.py"""
+
+    def __init__(self, indexes: Optional[Dict[str, list]] = None):
+        self._collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._indexes: Dict[str, List[_Index]] = {
+            collection_id: [_Index(fields, sort_field) for fields, sort_field in specs]
+            for collection_id, specs in (indexes if indexes is not None else DEFAULT_INDEXES).items()
+        }
+        self._transaction_lock = None
+        # Round trips and documents a real Firestore would have billed
+        self.stats = Counter()
+
+    @staticmethod
+    def field_path(*field_names: str) -> str:
+        return FieldPath(*field_names).to_api_repr()
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def collection(self, collection_id: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, collection_id)
+
+    def document(self, document_path: str) -> MemoryDocumentReference:
+        collection_id, document_id = document_path.split("/", 1)
+        return self.collection(collection_id).document(document_id)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        references = list(dict.fromkeys(references))
+        self._count(reads=len(references))
+        for reference in references:
+            yield self._snapshot(reference)
+
+    async def run_transaction(self, fn, *args, **kwargs):
+        """Run fn(transaction, ...) and commit its writes atomically.
+
+        Transactions are serialized, so reads inside one can't go stale.
+        """
+        if self._transaction_lock is None:
+            self._transaction_lock = asyncio.Lock()
+        async with self._transaction_lock:
+            transaction = self.transaction()
+            result = await fn(transaction, *args, **kwargs)
+            await transaction.commit()
+            return result
+
+    def clear(self) -> None:
+        self._collections.clear()
+        self.stats.clear()
+        for indexes in self._indexes.values():
+            for index in indexes:
+                index.sorted.clear()
+                index.unsorted.clear()
+
+    def _count(self, reads: int = 0, writes: int = 0) -> None:
+        self.stats["calls"] += 1
+        self.stats["reads"] += reads
+        self.stats["writes"] += writes
+
+    # Internals
+    def _collection(self, collection_id: str) -> Dict[str, Dict[str, Any]]:
+        return self._collections.setdefault(collection_id, {})
+
+    def _snapshot(self, reference: MemoryDocumentReference) -> MemorySnapshot:
+        # Stored dicts are replaced, never mutated, so snapshots can share them
+        return MemorySnapshot(reference, self._collection(reference.parent.id).get(reference.id))
+
+    def _plan(self, collection_id: str, filters) -> Iterable[str]:
+        """Pick the most selective index for a query, falling back to a scan"""
+        equals = {field: value for field, op, value in filters if op == "=="}
+        best = None
+        for index in self._indexes.get(collection_id, []):
+            if all(field in equals for field in index.fields):
+                if best is None or len(index.fields) > len(best.fields):
+                    best = index
+        if best is None:
+            return list(self._collection(collection_id))
+
+        ranges = [(op, value) for field, op, value in filters
+                  if field == best.sort_field and op in ("<", "<=", ">", ">=")]
+        return best.lookup(equals, ranges)
+
+    def _write(self, writes) -> None:
+        """Validate then apply a list of writes all-or-nothing"""
+        self._count(writes=len(writes))
+        now = self._now()
+        staged: Dict[str, Tuple[MemoryDocumentReference, Optional[Dict[str, Any]]]] = {}
+
+        def current(reference):
+            if reference.path in staged:
+                return staged[reference.path][1]
+            data = self._collection(reference.parent.id).get(reference.id)
+            return _copy(data) if data is not None else None
+
+        for kind, reference, data, merge in writes:
+            existing = current(reference)
+            if kind == "create":
+                if existing is not None:
+                    raise exceptions.AlreadyExists(f"Document already exists: {reference.path}")
+                new_data = {}
+                _merge(new_data, data, now)
+            elif kind == "set":
+                if merge is True:
+                    new_data = existing or {}
+                    _merge(new_data, data, now)
+                elif merge:
+                    new_data = existing or {}
+                    for field_path in merge:
+                        parts = _split_path(field_path)
+                        value = _get_path(data, parts)
+                        _set_path(new_data, parts, transforms.DELETE_FIELD if value is _MISSING else value, now)
+                else:
+                    new_data = {}
+                    _merge(new_data, data, now)
+            elif kind == "update":
+                if existing is None:
+                    raise exceptions.NotFound(f"No document to update: {reference.path}")
+                new_data = existing
+                for field_path, value in data.items():
+                    _set_path(new_data, _split_path(field_path), value, now)
+            else:
+                new_data = None
+            staged[reference.path] = (reference, new_data)
+
+        for reference, new_data in staged.values():
+            collection_id = reference.parent.id
+            store = self._collection(collection_id)
+            old_data = store.get(reference.id)
+            indexes = self._indexes.get(collection_id, [])
+            if old_data is not None:
+                for index in indexes:
+                    index.remove(reference.id, old_data)
+            if new_data is None:
+                store.pop(reference.id, None)
+                continue
+            store[reference.id] = new_data
+            for index in indexes:
+                index.add(reference.id, new_data)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Max number of verified tokens kept per worker
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Upper bound on how long a verified token is trusted without re-checking
+TOKEN_CACHE_MAX_TTL = int(os.getenv("TOKEN_CACHE_MAX_TTL", "3600"))
+
+
+class TokenCache:
+    """Bounded LRU cache of decoded Firebase ID tokens.
+
+    Entries are keyed by a SHA-256 of the raw token (the token itself is
+    never stored) and expire at the token's ``exp`` claim, or after
+    ``max_ttl`` seconds if that comes first. Google's public certs are not
+    handled here: ``verify_id_token`` keeps them in its own HTTP cache and
+    only re-fetches once their Cache-Control max-age runs out.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, max_ttl: int = TOKEN_CACHE_MAX_TTL):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached claims for a token, or None on miss/expiry"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """Cache verified claims until the token's exp claim"""
+        now = time.time()
+        exp = claims.get("exp")
+        if not exp or exp <= now:
+            return
+
+        key = self._key(token)
+        self._entries[key] = (min(float(exp), now + self.max_ttl), claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+
+token_cache = TokenCache()
+
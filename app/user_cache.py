@@ -0,0 +1,58 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+# Max number of user profiles remembered per worker
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+# How long a remembered profile is trusted before the user doc is checked again
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "3600"))
+
+
+class UserCache:
+    """Bounded LRU of the profile fields last known to be in each user's doc.
+
+    /auth/verify runs on every app launch with the same token claims, so a
+    matching entry means the users doc is already up to date and the sync
+    can skip Firestore. Entries expire after ``ttl`` seconds so a doc changed
+    or deleted elsewhere is picked up again.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: int = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def matches(self, uid: str, profile: Dict[str, Any]) -> bool:
+        """Whether the stored profile for uid is known to equal profile"""
+        entry = self._entries.get(uid)
+        if entry is None or entry[0] <= time.time() or entry[1] != profile:
+            self.misses += 1
+            return False
+
+        self._entries.move_to_end(uid)
+        self.hits += 1
+        return True
+
+    def put(self, uid: str, profile: Dict[str, Any]) -> None:
+        """Remember the profile just read from or written to the user's doc"""
+        self._entries[uid] = (time.time() + self.ttl, dict(profile))
+        self._entries.move_to_end(uid)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+
+user_cache = UserCache()
@@ -1,11 +1,8 @@
 import random
 import string
-from datetime import datetime, timedelta, date
-from typing import List, Set
-try:
-    from app.models import HabitType
-except ImportError:
-    from models import HabitType
+from datetime import datetime, timedelta, date, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+from app.models import HabitType, GroupRole
 
 
 def generate_join_code() -> str:
@@ -51,6 +48,119 @@ def compute_streak(habit_dates: List[date]) -> tuple[int, int]:
     
     return current_streak, best_streak
 
+def streak_state(habit_dates: Iterable[date]) -> Dict[str, Any]:
+    """
+    Build incremental streak state from every date a habit was logged:
+    the latest run of consecutive days plus the best run ever.
+    Days are stored as date ordinals.
+    """
+    ordinals = sorted({day.toordinal() for day in habit_dates})
+    if not ordinals:
+        return {"runStartDay": None, "lastDay": None, "currentRun": 0, "bestRun": 0}
+    
+    best_run = 0
+    run_start = ordinals[0]
+    for i in range(1, len(ordinals)):
+        if ordinals[i] != ordinals[i-1] + 1:
+            best_run = max(best_run, ordinals[i-1] - run_start + 1)
+            run_start = ordinals[i]
+    current_run = ordinals[-1] - run_start + 1
+    
+    return {
+        "runStartDay": run_start,
+        "lastDay": ordinals[-1],
+        "currentRun": current_run,
+        "bestRun": max(best_run, current_run)
+    }
+
+def advance_streak(state: Dict[str, Any], day: date) -> Optional[Dict[str, Any]]:
+    """
+    Apply one logged day to streak state in O(1).
+    Returns None when the day lands before the latest run (a backfill that may
+    join older runs), in which case the state must be rebuilt from history.
+    """
+    if state.get("lastDay") is None:
+        return streak_state([day])
+    
+    ordinal = day.toordinal()
+    run_start, last_day = state["runStartDay"], state["lastDay"]
+    if run_start <= ordinal <= last_day:
+        return state
+    if ordinal < run_start:
+        return None
+    
+    if ordinal == last_day + 1:
+        current_run = state["currentRun"] + 1
+    else:
+        run_start, current_run = ordinal, 1
+    
+    return {
+        "runStartDay": run_start,
+        "lastDay": ordinal,
+        "currentRun": current_run,
+        "bestRun": max(state["bestRun"], current_run)
+    }
+
+def current_streak(state: Dict[str, Any], today: date) -> int:
+    """Current streak as compute_streak defines it: consecutive days ending today"""
+    if state.get("lastDay") != today.toordinal():
+        return 0
+    return state["currentRun"]
+
+def to_utc_date(timestamp) -> date:
+    """Get the UTC calendar date of a naive (assumed UTC) or aware datetime"""
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc)
+        return timestamp.date()
+    return timestamp
+
+def day_key(day: date) -> str:
+    """Compact, sortable key for a calendar day (e.g. "20250915")"""
+    return day.strftime("%Y%m%d")
+
+def parse_day_key(key: str) -> date:
+    """Inverse of day_key"""
+    return date(int(key[:4]), int(key[4:6]), int(key[6:8]))
+
+def add_day_counts(days: Dict[str, int], timestamps: Iterable[datetime], window_start: date) -> Dict[str, int]:
+    """
+    Add one count per timestamp to a {day_key: count} map, dropping days
+    before window_start (for both existing and new entries)
+    """
+    start_key = day_key(window_start)
+    counts = {key: count for key, count in days.items() if key >= start_key}
+    for timestamp in timestamps:
+        key = day_key(to_utc_date(timestamp))
+        if key >= start_key:
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def rank_leaderboard(members: Dict[str, Dict[str, Any]], window_start: date) -> List[Dict[str, Any]]:
+    """
+    Turn a materialized {user_id: {displayName, role, days}} map into
+    leaderboard rows sorted by consistency score
+    """
+    start_key = day_key(window_start)
+    rows = []
+    for user_id, member in members.items():
+        weekly_logs = sum(count for key, count in member.get("days", {}).items() if key >= start_key)
+        
+        # Simple consistency score: logs per day (max 7 days = 100%)
+        consistency_score = min(100, (weekly_logs / 7) * 100)
+        
+        rows.append({
+            "user_id": user_id,
+            "display_name": member.get("displayName") or "Anonymous",
+            # Boards rebuilt before rebuilds were transactional can hold entries with days only
+            "role": member.get("role") or GroupRole.MEMBER.value,
+            "consistency_score": round(consistency_score, 1),
+            "weekly_logs": weekly_logs
+        })
+    
+    rows.sort(key=lambda row: (-row["consistency_score"], -row["weekly_logs"], row["user_id"]))
+    return rows
+
 def get_default_unit(habit_type: HabitType) -> str:
     """Get default unit for a habit type"""
     units = {
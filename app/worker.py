@@ -0,0 +1,284 @@
+"""
+Offline recompute of habit streaks and group leaderboards.
+
+    python -m app.worker                      # every user, then every group's leaderboard
+    python -m app.worker --resume             # continue after the last checkpointed user
+    python -m app.worker --workers 8 --page-size 5000 --skip-leaderboards
+
+habit_logs is streamed ordered by (uid, id) in pages of --page-size docs,
+reading only uid, habitType and timestamp. Every --shard-size users are sent
+to a process pool, which computes each habit's streak state (the numbers
+streak_state/compute_streak give, from app.analytics day bitsets) and the
+user's leaderboard-window day counts. Each user's results are written back
+in one transaction: their habit_streaks docs, plus the day counts on their
+user_activity doc if they have one (group ids and rollup state belong to the
+join and log writes, and a missing doc is bootstrapped by the next log write).
+The last written uid is checkpointed after every shard so --resume picks up
+where an interrupted run stopped. Finally every group's leaderboard doc is
+rebuilt, each in a transaction, from the refreshed activity docs.
+
+A user whose activity doc changes after their logs were read (they logged
+during the run) is skipped and counted rather than overwritten, because the
+recomputed state would miss that log. The check runs in the same transaction
+as the write, so a log landing in between is caught too. Re-run to pick them up.
+Leaderboards written by live traffic after the rebuild pass started are
+skipped the same way.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.analytics import day_mask, longest_run, trailing_run
+from app.utils import day_key, to_utc_date
+
+# [(uid, {habitType: [day ordinal per log]})]
+Shard = List[Tuple[str, Dict[str, List[int]]]]
+
+
+def _streak(ordinals: List[int]) -> Dict[str, Any]:
+    """streak_state for a habit's day ordinals, computed on a day bitset"""
+    origin = min(ordinals)
+    mask = day_mask(ordinals, origin)
+    last = mask.bit_length() - 1
+    current_run = trailing_run(mask, last)
+    return {
+        "runStartDay": origin + last - current_run + 1,
+        "lastDay": origin + last,
+        "currentRun": current_run,
+        "bestRun": longest_run(mask)
+    }
+
+
+def compute_shard(shard: Shard, window_start: int) -> List[Dict[str, Any]]:
+    """Streak states per habit and window day counts per user; runs in a pool process"""
+    results = []
+    for uid, habits in shard:
+        window = Counter(day for days in habits.values() for day in days if day >= window_start)
+        results.append({
+            "uid": uid,
+            "streaks": {habit: _streak(days) for habit, days in habits.items()},
+            "days": {day_key(date.fromordinal(day)): count for day, count in sorted(window.items())}
+        })
+    return results
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    # Write then rename so an interrupted save never leaves a truncated file
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+class Recompute:
+    """One run of the job: streams logs, fans shards out to the pool, writes results"""
+
+    def __init__(self, workers: int, page_size: int, shard_size: int, checkpoint_path: str):
+        # Imported here: pool processes import this module and need no Firestore client
+        from app import crud
+        from app.database import db_slot, run_transaction
+
+        self.crud = crud
+        self.db = crud.db
+        self.db_slot = db_slot
+        self.run_transaction = run_transaction
+        self.workers = workers
+        self.page_size = page_size
+        self.shard_size = shard_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint: Dict[str, Any] = {}
+        self.logs = 0
+        self.docs_written = 0
+        self.skipped: List[str] = []
+        self.skipped_groups: List[str] = []
+        self.started = time.perf_counter()
+
+    async def log_pages(self, after_uid: Optional[str]) -> AsyncIterator[list]:
+        """Pages of habit_logs ordered by (uid, id), starting after after_uid"""
+        query = self.db.collection("habit_logs")
+        if after_uid is not None:
+            query = query.where("uid", ">", after_uid)
+        query = query.order_by("uid").order_by("__name__").select(["uid", "habitType", "timestamp"])
+
+        last = None
+        while True:
+            page = query if last is None else query.start_after(last)
+            async with self.db_slot():
+                docs = await page.limit(self.page_size).get()
+            if docs:
+                last = {"uid": docs[-1].get("uid"), "__name__": docs[-1].id}
+                yield docs
+            if len(docs) < self.page_size:
+                return
+
+    async def shards(self, after_uid: Optional[str]) -> AsyncIterator[Tuple[Shard, datetime]]:
+        """
+        Group streamed logs into shards of complete users. Each shard comes with
+        the time its first user's logs started being read
+        """
+        shard: Shard = []
+        uid, habits, read_at = None, {}, None
+        async for docs in self.log_pages(after_uid):
+            for doc in docs:
+                log_data = doc.to_dict()
+                if log_data["uid"] != uid:
+                    if uid is not None:
+                        shard.append((uid, habits))
+                        if len(shard) == self.shard_size:
+                            yield shard, read_at
+                            shard, read_at = [], None
+                    uid, habits = log_data["uid"], {}
+                if read_at is None:
+                    read_at = datetime.now(timezone.utc)
+                habits.setdefault(log_data["habitType"], []).append(to_utc_date(log_data["timestamp"]).toordinal())
+                self.logs += 1
+        if uid is not None:
+            shard.append((uid, habits))
+            yield shard, read_at
+
+    async def write_user(self, transaction, result: Dict[str, Any], read_at: datetime) -> int:
+        """
+        Write one user's streaks and day counts unless they logged since
+        read_at; returns the number of docs written (0 when skipped)
+        """
+        uid = result["uid"]
+        activity_ref = self.db.collection("user_activity").document(uid)
+        snapshot = await activity_ref.get(transaction=transaction)
+        activity = snapshot.to_dict() if snapshot.exists else None
+        if activity is not None and activity.get("updatedAt") is not None and activity["updatedAt"] > read_at:
+            return 0
+
+        for habit, state in result["streaks"].items():
+            transaction.set(self.db.collection("habit_streaks").document(f"{uid}_{habit}"), {
+                "uid": uid,
+                "habitType": habit,
+                **state,
+                "updatedAt": self.crud.firestore.SERVER_TIMESTAMP
+            })
+        if activity is None:
+            return len(result["streaks"])
+        # Only the counts are replaced; groupIds and rollupsComplete stay as written
+        transaction.update(activity_ref, {"days": result["days"], "updatedAt": self.crud.firestore.SERVER_TIMESTAMP})
+        return len(result["streaks"]) + 1
+
+    async def write(self, results: List[Dict[str, Any]], read_at: datetime) -> None:
+        """Write a shard's streaks and activity, skipping users who logged since read_at"""
+        written = await asyncio.gather(
+            *(self.run_transaction(self.write_user, result, read_at) for result in results)
+        )
+        for result, docs in zip(results, written):
+            if docs:
+                self.docs_written += docs
+            else:
+                self.skipped.append(result["uid"])
+
+    def progress(self, users: int) -> None:
+        elapsed = time.perf_counter() - self.started
+        print(
+            f"{users} users, {self.logs} logs read ({self.logs / elapsed:,.0f} docs/s), "
+            f"{self.docs_written} docs written ({self.docs_written / elapsed:,.0f} docs/s)",
+            flush=True
+        )
+
+    async def streaks(self, resume: bool) -> int:
+        """Recompute every user's streaks and activity; returns users written"""
+        self.checkpoint = load_checkpoint(self.checkpoint_path) if resume else {}
+        after_uid = self.checkpoint.get("lastUid")
+        users = self.checkpoint.get("users", 0)
+        if after_uid is not None:
+            print(f"Resuming after {after_uid} ({users} users already done)")
+
+        window_start = self.crud.leaderboard_window_start().date().toordinal()
+        loop = asyncio.get_running_loop()
+        in_flight = deque()
+
+        async def drain_one():
+            nonlocal users
+            future, shard, read_at = in_flight.popleft()
+            await self.write(await future, read_at)
+            users += len(shard)
+            # Shards are written in uid order, so everything up to here is done
+            self.checkpoint = {"lastUid": shard[-1][0], "users": users}
+            save_checkpoint(self.checkpoint_path, self.checkpoint)
+            self.progress(users)
+
+        # Spawned rather than forked so pool processes never inherit gRPC channels
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context) as pool:
+            async for shard, read_at in self.shards(after_uid):
+                in_flight.append((loop.run_in_executor(pool, compute_shard, shard, window_start), shard, read_at))
+                # Bounded lookahead keeps memory flat while the pool stays busy
+                if len(in_flight) >= self.workers * 2:
+                    await drain_one()
+            while in_flight:
+                await drain_one()
+        return users
+
+    async def leaderboards(self, concurrency: int) -> int:
+        """Rebuild every group's leaderboard doc, skipping ones written since
+        the pass started; returns the number of groups rebuilt"""
+        read_at = datetime.now(timezone.utc)
+        async with self.db_slot():
+            group_docs = await self.db.collection("groups").select([]).get()
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def rebuild(group_id: str) -> bool:
+            async with semaphore:
+                board = await self.crud.rebuild_group_leaderboard(group_id, unchanged_since=read_at)
+            if board is None:
+                self.skipped_groups.append(group_id)
+            return board is not None
+
+        rebuilt = await asyncio.gather(*(rebuild(doc.id) for doc in group_docs))
+        return sum(rebuilt)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recompute streaks and leaderboards from raw habit logs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Pool processes")
+    parser.add_argument("--page-size", type=int, default=2000, help="habit_logs docs per page read")
+    parser.add_argument("--shard-size", type=int, default=200, help="Users per pool task")
+    parser.add_argument("--checkpoint", default=".worker-checkpoint.json", help="Progress file for --resume")
+    parser.add_argument("--resume", action="store_true", help="Continue after the last checkpointed user")
+    parser.add_argument("--skip-leaderboards", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=8, help="Leaderboards rebuilt at once")
+    args = parser.parse_args()
+
+    job = Recompute(args.workers, args.page_size, args.shard_size, args.checkpoint)
+    users = await job.streaks(args.resume)
+    elapsed = time.perf_counter() - job.started
+    print(
+        f"Recomputed {users} users from {job.logs} logs in {elapsed:.1f}s: "
+        f"{job.logs / elapsed:,.0f} docs/s read, {job.docs_written / elapsed:,.0f} docs/s written"
+    )
+    if job.skipped:
+        print(f"Skipped {len(job.skipped)} users who logged during the run; re-run to include them")
+
+    if not args.skip_leaderboards:
+        start = time.perf_counter()
+        groups = await job.leaderboards(args.concurrency)
+        print(f"Rebuilt {groups} leaderboards in {time.perf_counter() - start:.1f}s")
+        if job.skipped_groups:
+            print(f"Skipped {len(job.skipped_groups)} leaderboards updated during the run; re-run to include them")
+
+    # A finished run starts from the beginning next time
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
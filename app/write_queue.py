@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+# Coalesce POST /habits/log writes per user ("1") instead of one transaction per log
+LOG_QUEUE_ENABLED = os.getenv("LOG_QUEUE_ENABLED", "0") == "1"
+# How long a user's first queued log waits for more before the batch is written
+LOG_QUEUE_WINDOW_MS = int(os.getenv("LOG_QUEUE_WINDOW_MS", "10"))
+# Logs held per worker before new submitters wait for flushes (backpressure)
+LOG_QUEUE_MAX_PENDING = int(os.getenv("LOG_QUEUE_MAX_PENDING", "5000"))
+# Logs written per batch
+LOG_QUEUE_MAX_BATCH = int(os.getenv("LOG_QUEUE_MAX_BATCH", "100"))
+# Tries per batch before its submitters get the error
+LOG_QUEUE_ATTEMPTS = int(os.getenv("LOG_QUEUE_ATTEMPTS", "3"))
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """Write-behind queue that coalesces items per key into batched flushes.
+
+    submit() parks an item under its key and returns once the batch holding
+    it has been flushed, so a completed submit means the item is durable. The
+    first item for an idle key starts a flusher that waits ``window`` seconds
+    for more, then hands up to ``max_batch`` items to flush(key, items, retry);
+    items arriving while a batch is being written go in the next one. Failed
+    batches are retried (at-least-once) with retry=True, which tells flush
+    that an earlier attempt may have been committed. At most ``max_pending``
+    items are held: submit() waits for room beyond that.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Hashable, List[Any], bool], Awaitable[Any]],
+        window: float = LOG_QUEUE_WINDOW_MS / 1000,
+        max_pending: int = LOG_QUEUE_MAX_PENDING,
+        max_batch: int = LOG_QUEUE_MAX_BATCH,
+        attempts: int = LOG_QUEUE_ATTEMPTS,
+    ):
+        self._flush = flush
+        self.window = window
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.attempts = attempts
+        self._room = asyncio.Semaphore(max_pending)
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._flushers: Dict[Hashable, asyncio.Task] = {}
+        self._closing = asyncio.Event()
+        self.submitted = 0
+        self.flushes = 0
+        self.retries = 0
+        self.failures = 0
+        self.waits = 0
+
+    async def submit(self, key: Hashable, item: Any) -> None:
+        """Queue an item and wait until it has been written"""
+        if self._closing.is_set():
+            raise RuntimeError("Write queue is closed")
+        if self._room.locked():
+            self.waits += 1
+        await self._room.acquire()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, []).append((item, future))
+        self.submitted += 1
+        if key not in self._flushers:
+            self._flushers[key] = asyncio.create_task(self._run(key))
+        # A cancelled request must not cancel the write others are batched with
+        await asyncio.shield(future)
+
+    async def _run(self, key: Hashable) -> None:
+        try:
+            while self._pending.get(key):
+                if self.window and not self._closing.is_set():
+                    # Closing cuts the wait short
+                    try:
+                        await asyncio.wait_for(self._closing.wait(), self.window)
+                    except asyncio.TimeoutError:
+                        pass
+                pending = self._pending[key]
+                batch, pending[:] = pending[:self.max_batch], pending[self.max_batch:]
+                await self._write(key, batch)
+        finally:
+            self._pending.pop(key, None)
+            del self._flushers[key]
+
+    async def _write(self, key: Hashable, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            for attempt in range(self.attempts):
+                try:
+                    await self._flush(key, items, attempt > 0)
+                    break
+                except Exception as e:
+                    if attempt + 1 == self.attempts:
+                        raise
+                    self.retries += 1
+                    logger.warning("Write queue flush failed, retrying: %s", e)
+                    await asyncio.sleep(0.05 * 2 ** attempt)
+        except Exception as e:
+            self.failures += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self.flushes += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            for _ in batch:
+                self._room.release()
+
+    async def close(self) -> None:
+        """Stop accepting items and write everything already queued"""
+        self._closing.set()
+        while self._flushers:
+            await asyncio.gather(*list(self._flushers.values()), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": sum(len(items) for items in self._pending.values()),
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "flushes": self.flushes,
+            "retries": self.retries,
+            "failures": self.failures,
+            "waits": self.waits,
+        }
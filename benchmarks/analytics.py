@@ -0,0 +1,90 @@
+"""
+Streak/consistency benchmark: per-habit compute_streak calls vs ActivityMatrix.
+
+Generates random daily activity for N members x 4 habits over a year, then
+computes current + best streaks and 7-day consistency for everyone both ways
+and checks that the results agree.
+
+    python -m benchmarks.analytics --members 5000 --days 365
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app.analytics import ActivityMatrix
+from app.models import HabitType
+from app.utils import compute_streak
+
+
+def generate(members: int, days: int, density: float, seed: int):
+    rng = random.Random(seed)
+    today = date.today()
+    history = {}
+    for member in range(members):
+        for habit in HabitType:
+            # Alternate active and idle spells so streaks have realistic lengths
+            dates, active, day = [], rng.random() < density, 0
+            while day < days:
+                spell = rng.randint(1, 14)
+                if active:
+                    dates.extend(today - timedelta(days=day + i) for i in range(min(spell, days - day)))
+                day += spell
+                active = rng.random() < density
+            history[(f"user{member}", habit.value)] = dates
+    return today, history
+
+
+def per_habit(today, history):
+    streaks = {key: compute_streak(dates) for key, dates in history.items()}
+    week = {today - timedelta(days=i) for i in range(7)}
+    active = {}
+    for (member, _), dates in history.items():
+        active.setdefault(member, set()).update(day for day in dates if day in week)
+    consistency = {member: round(len(days) / 7 * 100, 1) for member, days in active.items()}
+    return streaks, consistency
+
+
+def vectorized(today, history, origin):
+    matrix = ActivityMatrix(origin)
+    for (member, habit), dates in history.items():
+        matrix.add_days(member, habit, dates)
+    current, best = matrix.current_streaks(today), matrix.best_streaks()
+    streaks = {key: (current.get(key, 0), best.get(key, 0)) for key in history}
+    return streaks, matrix.consistency(today), matrix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--density", type=float, default=0.6, help="Chance each spell is active")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    today, history = generate(args.members, args.days, args.density, args.seed)
+    origin = today - timedelta(days=args.days)
+    print(f"{args.members} members, {sum(len(d) for d in history.values())} active habit-days\n")
+
+    start = time.perf_counter()
+    old_streaks, old_consistency = per_habit(today, history)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_streaks, new_consistency, matrix = vectorized(today, history, origin)
+    build_time = time.perf_counter()
+    matrix.current_streaks(today), matrix.best_streaks(), matrix.consistency(today)
+    query_time = time.perf_counter() - build_time
+    new_time = build_time - start
+
+    assert old_streaks == new_streaks, "streaks differ"
+    assert {m: c for m, c in old_consistency.items() if c} == {m: c for m, c in new_consistency.items() if c}, \
+        "consistency differs"
+
+    print(f"compute_streak per habit   {old_time * 1000:9.1f} ms")
+    print(f"ActivityMatrix build+query {new_time * 1000:9.1f} ms")
+    print(f"ActivityMatrix query only  {query_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
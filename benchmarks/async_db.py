@@ -0,0 +1,80 @@
+"""
+Throughput benchmark: blocking Firestore client vs the async data layer.
+
+Runs N concurrent "clients" inside one event loop (like a single uvicorn
+worker). Each client repeatedly reads one document, either through the
+synchronous ``firestore.Client`` called from a coroutine (the old path) or
+through ``app.database`` (AsyncClient + concurrency limiter).
+
+Needs the same environment as the API (GOOGLE_APPLICATION_CREDENTIALS).
+
+    python -m benchmarks.async_db --clients 50 100 250 500 --requests 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from google.cloud import firestore
+
+from app import database
+
+
+async def run_clients(read_once, clients: int, total_requests: int):
+    """Fire total_requests reads spread over `clients` concurrent workers"""
+    latencies = []
+    remaining = total_requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            await read_once()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def report(label: str, clients: int, elapsed: float, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label:<9} clients={clients:<4} "
+        f"throughput={len(latencies) / elapsed:8.1f} req/s  "
+        f"p50={statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p99={p99 * 1000:7.1f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 100, 250, 500])
+    parser.add_argument("--requests", type=int, default=2000, help="Reads per run")
+    parser.add_argument("--collection", default="users")
+    parser.add_argument("--document", default="benchmark-probe")
+    args = parser.parse_args()
+
+    sync_ref = firestore.Client().collection(args.collection).document(args.document)
+    async_ref = database.get_db().collection(args.collection).document(args.document)
+
+    async def blocking_read():
+        sync_ref.get()
+
+    async def async_read():
+        async with database.db_slot():
+            await async_ref.get()
+
+    print(f"FIRESTORE_MAX_CONCURRENCY={database.MAX_CONCURRENCY}")
+    for clients in args.clients:
+        elapsed, latencies = await run_clients(blocking_read, clients, args.requests)
+        report("blocking", clients, elapsed, latencies)
+        elapsed, latencies = await run_clients(async_read, clients, args.requests)
+        report("async", clients, elapsed, latencies)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""
+Auth latency benchmark for get_current_user, with and without the token cache.
+
+Verifies the same Firebase ID token repeatedly and reports p50/p99. The
+"uncached" run clears the cache before every call, which is the old
+behaviour (RSA check on every request).
+
+    python -m benchmarks.auth_cache --token "$ID_TOKEN" --requests 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from app.routers.auth import get_current_user
+from app.token_cache import token_cache
+
+
+async def measure(header: str, requests: int, cached: bool):
+    latencies = []
+    for _ in range(requests):
+        if not cached:
+            token_cache.clear()
+        start = time.perf_counter()
+        await get_current_user(authorization=header)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def report(label: str, latencies):
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label:<9} p50={statistics.median(latencies) * 1000:8.3f} ms  "
+        f"p99={p99 * 1000:8.3f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token", default=os.getenv("BENCH_ID_TOKEN"), help="Firebase ID token")
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+    if not args.token:
+        parser.error("--token or BENCH_ID_TOKEN is required")
+
+    header = f"Bearer {args.token}"
+    # Warm-up so both runs start with certs already fetched
+    await get_current_user(authorization=header)
+
+    report("uncached", await measure(header, args.requests, cached=False))
+    token_cache.clear()
+    report("cached", await measure(header, args.requests, cached=True))
+    print(token_cache.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,301 @@
+"""
+Load and benchmark suite for every endpoint in routers/auth.py, habits.py
+and groups.py.
+
+Runs fully offline: the API uses the in-memory storage backend and token
+verification is stubbed (the bearer token is taken as the uid). The store is
+seeded with synthetic users, groups and multi-month log histories, then each
+endpoint is driven in-process by concurrent clients. For every endpoint the
+report shows throughput, p50/p95/p99 latency and the Firestore calls,
+document reads and writes a real project would have billed per request.
+
+    python -m benchmarks.load --users 200 --groups 20 --days 90
+    python -m benchmarks.load --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.load --compare benchmarks/baselines/local.json
+
+--compare exits with status 1 when an endpoint regresses: more Firestore
+operations per request than the baseline, or p95 latency beyond
+--latency-tolerance (only meaningful on the machine that made the baseline).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+os.environ["STORAGE_BACKEND"] = "memory"
+
+from fastapi import Header  # noqa: E402
+
+import app.main  # noqa: E402
+from app import crud  # noqa: E402
+from app.database import get_db  # noqa: E402
+from app.models import HabitType  # noqa: E402
+from app.routers.auth import get_current_user  # noqa: E402
+
+HABIT_TYPES = list(HabitType)
+
+
+async def stub_current_user(authorization: str = Header(None)):
+    """Token verification stand-in: "Bearer <uid>" authenticates as <uid>"""
+    uid = authorization.split(" ", 1)[1]
+    return {"uid": uid, "name": f"Student {uid}", "email": f"{uid}@example.edu"}
+
+
+async def call(method: str, path: str, uid: str, body=None, params=None):
+    """Send one request straight into the ASGI app; returns (status, body bytes)"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params or {}).encode(),
+        "root_path": "",
+        "headers": [
+            (b"authorization", f"Bearer {uid}".encode()),
+            (b"content-type", b"application/json"),
+        ],
+        "client": ("benchmark", 0),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+    status = None
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Never disconnect; streaming responses cancel this wait when done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app.main.app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def seed(rng: random.Random, users: int, groups: int, days: int, logs_per_day: float):
+    """Create users with log histories, groups and memberships through crud"""
+    uids = [f"user{i:05d}" for i in range(users)]
+    now = datetime.utcnow()
+    log_count = 0
+    for uid in uids:
+        await crud.create_or_update_user(uid, email=f"{uid}@example.edu", display_name=f"Student {uid}")
+        entries = []
+        for day in range(days):
+            for n in range(rng.randint(0, round(logs_per_day * 2))):
+                entries.append({
+                    "client_id": f"seed-{day}-{n}",
+                    "habit_type": rng.choice(HABIT_TYPES),
+                    "value": round(rng.uniform(0.5, 8), 1),
+                    "unit": None,
+                    "timestamp": now - timedelta(days=day, minutes=rng.randint(0, 1439)),
+                })
+        log_count += len(entries)
+        await crud.add_habit_logs(uid, entries)
+
+    group_list = []
+    for n in range(groups):
+        owner = uids[n % len(uids)]
+        group = await crud.create_group(f"Group {n}", owner)
+        group_list.append({"id": group["id"], "join_code": group["joinCode"], "members": [owner]})
+
+    memberships = {uid: [] for uid in uids}
+    for group in group_list:
+        memberships[group["members"][0]].append(group)
+    for uid in uids:
+        for group in rng.sample(group_list, k=min(len(group_list), rng.randint(1, 3))):
+            if uid not in group["members"]:
+                await crud.join_group(group["join_code"], uid)
+                group["members"].append(uid)
+                memberships[uid].append(group)
+
+    return {"uids": uids, "groups": group_list, "memberships": memberships, "logs": log_count}
+
+
+def scenarios(ctx, rng: random.Random):
+    """Request factories per endpoint: each returns (method, path, uid, body, params)"""
+    uids, groups = ctx["uids"], ctx["groups"]
+    counter = iter(range(10 ** 9))
+
+    def any_user():
+        return rng.choice(uids)
+
+    def log_entry(client_id=None):
+        entry = {"habit_type": rng.choice(HABIT_TYPES).value, "value": round(rng.uniform(0.5, 8), 1)}
+        if client_id:
+            entry["client_id"] = client_id
+        return entry
+
+    def leaderboard():
+        group = rng.choice(groups)
+        return ("GET", f"/groups/{group['id']}/leaderboard", rng.choice(group["members"]), None, None)
+
+    return {
+        "POST /auth/verify": lambda: ("POST", "/auth/verify", any_user(), None, None),
+        "GET /auth/me": lambda: ("GET", "/auth/me", any_user(), None, None),
+        "GET /habits/logs": lambda: ("GET", "/habits/logs", any_user(), None, {"days": 30}),
+        "GET /habits/logs?format=ndjson": lambda: (
+            "GET", "/habits/logs", any_user(), None, {"days": 90, "format": "ndjson"}
+        ),
+        "GET /habits/streak/{habit_type}": lambda: (
+            "GET", f"/habits/streak/{rng.choice(HABIT_TYPES).value}", any_user(), None, None
+        ),
+        "GET /habits/summary": lambda: ("GET", "/habits/summary", any_user(), None, {"days": 7}),
+        "GET /groups/my-groups": lambda: ("GET", "/groups/my-groups", any_user(), None, None),
+        "GET /groups/{group_id}/leaderboard": leaderboard,
+        "POST /habits/log": lambda: ("POST", "/habits/log", any_user(), log_entry(), None),
+        "POST /habits/log/batch": lambda: (
+            "POST", "/habits/log/batch", any_user(),
+            {"entries": [log_entry(f"bench-{next(counter)}") for _ in range(50)]}, None
+        ),
+        "POST /groups/join": lambda: (
+            "POST", "/groups/join", any_user(), {"join_code": rng.choice(groups)["join_code"]}, None
+        ),
+        "POST /groups/create": lambda: (
+            "POST", "/groups/create", any_user(), {"name": f"Bench {next(counter)}"}, None
+        ),
+    }
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_endpoint(make_request, requests: int, concurrency: int):
+    """Drive one endpoint; returns metrics including Firestore ops per request"""
+    stats = get_db().stats
+    before = dict(stats)
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def client():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, uid, body, params = make_request()
+            start = time.perf_counter()
+            status, _ = await call(method, path, uid, body, params)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "calls_per_request": round((stats["calls"] - before.get("calls", 0)) / requests, 2),
+        "reads_per_request": round((stats["reads"] - before.get("reads", 0)) / requests, 2),
+        "writes_per_request": round((stats["writes"] - before.get("writes", 0)) / requests, 2),
+    }
+
+
+def print_report(results):
+    header = f"{'endpoint':<36} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls':>6} {'reads':>8} {'writes':>7} {'err':>4}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<36} {r['throughput']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+            f"{r['calls_per_request']:>6.1f} {r['reads_per_request']:>8.1f} {r['writes_per_request']:>7.1f} {r['errors']:>4}"
+        )
+
+
+def compare(results, baseline, latency_tolerance: float, ops_tolerance: float) -> list:
+    """List regressions of results against a saved baseline"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for metric in ("calls_per_request", "reads_per_request", "writes_per_request"):
+            if r[metric] > base[metric] * (1 + ops_tolerance) + 0.05:
+                regressions.append(f"{name}: {metric} {base[metric]} -> {r[metric]}")
+        if r["p95_ms"] > base["p95_ms"] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95_ms {base['p95_ms']} -> {r['p95_ms']}")
+        if r["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {r['errors']}")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--days", type=int, default=90, help="Days of log history per user")
+    parser.add_argument("--logs-per-day", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--endpoints", nargs="*", help="Only run endpoints containing these substrings")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5)
+    parser.add_argument("--ops-tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    app.main.app.dependency_overrides[get_current_user] = stub_current_user
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    ctx = await seed(rng, args.users, args.groups, args.days, args.logs_per_day)
+    print(
+        f"Seeded {len(ctx['uids'])} users, {len(ctx['groups'])} groups, {ctx['logs']} logs "
+        f"in {time.perf_counter() - start:.1f}s\n"
+    )
+
+    results = {}
+    for name, make_request in scenarios(ctx, rng).items():
+        if args.endpoints and not any(part in name for part in args.endpoints):
+            continue
+        results[name] = await run_endpoint(make_request, args.requests, args.concurrency)
+    print_report(results)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("save_baseline", "compare", "endpoints")}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("\nWarning: baseline was recorded with a different configuration")
+        regressions = compare(results, baseline, args.latency_tolerance, args.ops_tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Multi-worker scaling benchmark for the pre-fork serving profile.
+
+Pre-fork workers share nothing, so N workers behave like N copies of the
+app, each with its own client, caches and event loop. This runs the offline
+load suite (benchmarks/load.py) in N fresh processes at once, starting each
+endpoint in all of them together, and reports the aggregate req/s per
+endpoint and the speed-up over a single process. Near-linear scaling needs
+at least N free CPUs.
+
+    python -m benchmarks.scaling --processes 1 2 4
+    python -m benchmarks.scaling --processes 1 4 --endpoints "GET /habits"
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+
+
+async def run_suite(args, barrier):
+    # Imported in the child: benchmarks.load switches to the memory backend
+    from benchmarks import load
+
+    load.app.main.app.dependency_overrides[load.get_current_user] = load.stub_current_user
+    rng = random.Random(args.seed)
+    ctx = await load.seed(rng, args.users, args.groups, args.days, args.logs_per_day)
+
+    results = {}
+    for name, make_request in load.scenarios(ctx, rng).items():
+        if args.endpoints and not any(part in name for part in args.endpoints):
+            continue
+        # Every process starts the endpoint together so the runs overlap
+        barrier.wait()
+        results[name] = await load.run_endpoint(make_request, args.requests, args.concurrency)
+    return results
+
+
+def worker(args, barrier, results):
+    results.put(asyncio.run(run_suite(args, barrier)))
+
+
+def run(args, processes: int):
+    """Aggregate req/s per endpoint over `processes` concurrent suites"""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    children = [context.Process(target=worker, args=(args, barrier, results)) for _ in range(processes)]
+    for child in children:
+        child.start()
+    runs = [results.get() for _ in children]
+    for child in children:
+        child.join()
+    return {name: sum(run[name]["throughput"] for run in runs) for name in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--days", type=int, default=90, help="Days of log history per user")
+    parser.add_argument("--logs-per-day", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint per process")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--endpoints", nargs="*", help="Only run endpoints containing these substrings")
+    args = parser.parse_args()
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    if max(args.processes) > cpus:
+        print(f"Warning: only {cpus} CPUs available, runs beyond that cannot scale\n")
+
+    table = {processes: run(args, processes) for processes in args.processes}
+    base, top = args.processes[0], args.processes[-1]
+
+    header = f"{'endpoint':<36}" + "".join(f" {f'{n} proc req/s':>15}" for n in args.processes) + f" {'speed-up':>9}"
+    print(header)
+    print("-" * len(header))
+    for name in table[base]:
+        speedup = table[top][name] / table[base][name]
+        print(
+            f"{name:<36}" + "".join(f" {table[n][name]:>15.1f}" for n in args.processes)
+            + f" {speedup:>8.2f}x"
+        )
+    print(f"\nIdeal speed-up from {base} to {top} processes: {top / base:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
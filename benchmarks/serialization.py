@@ -0,0 +1,100 @@
+"""
+Response serialization benchmark: FastAPI's default JSON path vs the orjson
+response class in app/responses.py.
+
+For habit log pages and leaderboards of growing size, "default" is what a
+handler returning the payload costs FastAPI: response_model validation,
+jsonable_encoder, then Starlette's JSONResponse (json.dumps). "orjson" is
+what the handlers do now: validated() against the same schema, rendered
+with ORJSONResponse. Pydantic responses are compared the same way:
+jsonable_encoder + json.dumps vs the model's compiled serializer.
+
+    python -m benchmarks.serialization --sizes 10 100 1000 --runs 200
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.models import HabitLogRecord, HabitType
+from app.responses import ORJSONResponse, validated
+from app.schemas import HabitLogBatchOut, HabitLogBatchResult, HabitLogsPage, LeaderboardOut
+
+HABIT_TYPES = list(HabitType)
+
+
+def log_page(size: int):
+    now = datetime.now(timezone.utc)
+    logs = [
+        HabitLogRecord(f"log{i:06d}", "user000001", HABIT_TYPES[i % 4].value, float(i % 9 + 1), "hours",
+                       now - timedelta(minutes=i))
+        for i in range(size)
+    ]
+    return {"logs": logs, "total_count": size, "days_requested": 365, "habit_type": "all", "next_cursor": None}
+
+
+def leaderboard(size: int):
+    rows = [
+        {"user_id": f"user{i:06d}", "display_name": f"Student {i}", "role": "member",
+         "consistency_score": round(100 - i * 0.01, 1), "weekly_logs": i % 20}
+        for i in range(size)
+    ]
+    return {"group_id": "g1", "group_name": "Bench", "leaderboard": rows,
+            "week_start": datetime.now(timezone.utc), "total_members": size, "offset": 0, "limit": size}
+
+
+def batch_result(size: int):
+    results = [HabitLogBatchResult(index=i, client_id=f"c{i}", id=f"u_c{i}", status="created") for i in range(size)]
+    return HabitLogBatchOut(results=results, created=size, duplicates=0, failed=0)
+
+
+def measure(render, payload, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = render(payload)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    # Schemas the dict payloads are validated against (models need no adapter)
+    payloads = {
+        "log page": (log_page, TypeAdapter(HabitLogsPage)),
+        "leaderboard": (leaderboard, TypeAdapter(LeaderboardOut)),
+        "batch result": (batch_result, None),
+    }
+
+    header = f"{'payload':<14} {'items':>6} {'bytes':>9} {'default us':>11} {'orjson us':>10} {'speed-up':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, (build, adapter) in payloads.items():
+        if adapter is None:
+            default_path = lambda payload: JSONResponse(jsonable_encoder(payload)).body
+            fast_path = lambda payload: ORJSONResponse(payload).body
+        else:
+            default_path = lambda payload: JSONResponse(
+                jsonable_encoder(adapter.validate_python(payload, from_attributes=True))
+            ).body
+            fast_path = lambda payload: ORJSONResponse(validated(adapter, payload)).body
+        for size in args.sizes:
+            payload = build(size)
+            default, size_bytes = measure(default_path, payload, args.runs)
+            fast, _ = measure(fast_path, payload, args.runs)
+            print(
+                f"{name:<14} {size:>6} {size_bytes:>9} {default * 1e6:>11.1f} {fast * 1e6:>10.1f} "
+                f"{default / fast:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
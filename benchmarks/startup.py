@@ -0,0 +1,105 @@
+"""
+Startup benchmark: how long a fresh worker takes to import the app and to
+answer its first request.
+
+Each run is a new interpreter, so nothing is cached between runs. "import"
+times `import app.main`; "first response" starts `uvicorn app.main:app` on
+a free port and polls /health until it answers, which includes building the
+database client in the lifespan. With the memory backend it also checks
+that starting a worker never loads firebase_admin.
+
+    python -m benchmarks.startup --backend memory --runs 10
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start)"
+)
+
+# Runs the lifespan and idles in it long enough for background tasks to start,
+# then lists the Firebase modules the worker loaded
+LIFESPAN_SNIPPET = (
+    "import asyncio, sys; import app.main as m\n"
+    "async def run():\n"
+    "    async with m.lifespan(m.app): await asyncio.sleep(0.5)\n"
+    "asyncio.run(run()); print(sorted(k for k in sys.modules if k.startswith('firebase_admin')))"
+)
+
+
+def time_import(env) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], env=env, check=True, capture_output=True, text=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def firebase_modules_at_startup(env) -> str:
+    out = subprocess.run(
+        [sys.executable, "-c", LIFESPAN_SNIPPET], env=env, check=True, capture_output=True, text=True
+    )
+    return out.stdout.strip().splitlines()[-1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_first_response(env, timeout: float) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"no response within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(label: str, samples):
+    print(
+        f"{label:<15} p50={statistics.median(samples) * 1000:7.1f} ms  "
+        f"min={min(samples) * 1000:7.1f} ms  max={max(samples) * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "firestore"], default="memory")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ, STORAGE_BACKEND=args.backend)
+    if args.backend == "memory":
+        loaded = firebase_modules_at_startup(env)
+        if loaded != "[]":
+            sys.exit(f"startup loaded Firebase modules with the memory backend: {loaded}")
+    report("import", [time_import(env) for _ in range(args.runs)])
+    report("first response", [time_first_response(env, args.timeout) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
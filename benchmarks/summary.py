@@ -0,0 +1,77 @@
+"""
+/habits/summary benchmark: per-habit sequential queries vs the summary engine.
+
+The "sequential" path is the old handler: get_habit_logs + get_streak for
+each habit type, one after another. The "engine" path is
+crud.summarize_habits. Round trips are counted by wrapping crud's db_slot(),
+which every Firestore call goes through.
+
+    python -m benchmarks.summary --uid <user-with-logs> --days 7 --runs 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from contextlib import asynccontextmanager
+
+from app import crud
+from app.models import HabitType
+
+round_trips = 0
+_db_slot = crud.db_slot
+
+
+@asynccontextmanager
+async def counting_slot():
+    global round_trips
+    round_trips += 1
+    async with _db_slot():
+        yield
+
+
+async def sequential_summary(uid: str, days: int):
+    summary = {}
+    for habit_type in HabitType:
+        logs = await crud.get_habit_logs(uid=uid, habit_type=habit_type, days=days)
+        streak_data = await crud.get_streak(uid=uid, habit_type=habit_type)
+        summary[habit_type.value] = {
+            "total_entries": len(logs),
+            "current_streak": streak_data["current_streak"],
+            "best_streak": streak_data["best_streak"],
+            "recent_logs": logs[:5]
+        }
+    return summary
+
+
+async def measure(label: str, summarize, uid: str, days: int, runs: int):
+    global round_trips
+    latencies = []
+    round_trips = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        await summarize(uid, days)
+        latencies.append(time.perf_counter() - start)
+    print(
+        f"{label:<10} round_trips/request={round_trips / runs:5.1f}  "
+        f"p50={statistics.median(latencies) * 1000:7.1f} ms  "
+        f"max={max(latencies) * 1000:7.1f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uid", required=True)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    crud.db_slot = counting_slot
+    # Warm-up builds any missing streak state so both paths read the same docs
+    await crud.summarize_habits(args.uid, args.days)
+
+    await measure("sequential", sequential_summary, args.uid, args.days, args.runs)
+    await measure("engine", crud.summarize_habits, args.uid, args.days, args.runs)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
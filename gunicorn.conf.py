@@ -0,0 +1,52 @@
+"""
+Production serving profile: `gunicorn app.main:app` (gunicorn reads this file
+from the working directory).
+
+One uvicorn worker per available CPU by default. Workers share nothing: each
+builds its own Firestore client in the app lifespan, after the fork, and
+keeps its own caches. Caches that another worker's writes can't invalidate
+(responses without RESPONSE_CACHE_URL, membership lists) are off when there
+is more than one worker. Settings come from the environment:
+
+    PORT               port to bind (default 8000)
+    WEB_CONCURRENCY    number of workers (default: CPUs available to the container)
+    GRACEFUL_TIMEOUT   seconds a stopping worker gets to finish requests and
+                       flush queued writes (default 30)
+    KEEPALIVE          seconds to hold idle keep-alive connections (default 5)
+"""
+import math
+import os
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honouring affinity and a cgroup v2 CPU quota"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or available_cpus())
+# Workers inherit the environment; the app reads the count from it
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Never import the app in the master: clients and gRPC channels must not
+# cross a fork, so each worker loads the app itself
+preload_app = False
+
+# SIGTERM stops accepting connections, then runs the lifespan shutdown
+# (queued writes flushed) within this many seconds
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+accesslog = "-"